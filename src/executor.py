@@ -0,0 +1,106 @@
+"""
+Runs each job in its own process under a hard wall-clock deadline.
+
+The optimizers check their time limits only between solver calls, so a job can overrun its
+timeout by a lot. The job process reports every incumbent it finds (through the on_improve
+hook of src.stats) and is killed at the deadline; the last incumbent is then all that is
+left of it. A job that raises (or dies) is reported as failed, not as timed out.
+
+The job runs in its own session, so the processes it starts (GA islands, portfolio members,
+pricing pools) are killed with it. Jobs are started by a fork server rather than forked from
+the caller, which may have other threads running solvers (see src.runner). Unix only.
+"""
+
+import os
+import queue
+import signal
+import traceback
+import numpy as np
+import multiprocessing as mp
+from time import time
+from src import stats
+
+def _run(target, args, initializer, initargs, instrument, messages):
+    os.setsid() # A process group of its own, killed at the deadline
+    if initializer is not None:
+        initializer(*initargs)
+
+    def on_improve(lb, ub, x):
+        x = None if x is None else np.array(x, dtype=np.uint8)
+        messages.put(('incumbent', (time(), lb, ub, x)))
+    with stats.collect(instrument, on_improve):
+        messages.put(('start', time()))
+        try:
+            value = target(*args)
+        except BaseException:
+            messages.put(('error', traceback.format_exc()))
+            raise
+        messages.put(('result', value))
+
+
+class Incumbents:
+    """
+    Incumbents reported by a job: the (time, LB, UB) trace, relative to the start of its run
+    (as the traces of src.stats), and the clients decision of the best one (None if it was not reported). elapsed is
+    the wall time of the job.
+    """
+
+    def __init__(self, start_time):
+        self.start_time = start_time
+        self.elapsed = None
+        self.trace = []
+        self.lb, self.ub, self.x = None, None, None
+
+    def add(self, at, lb, ub, x):
+        if lb != self.lb:
+            self.x = x # None when reported without it: an older decision is not this incumbent
+        self.lb, self.ub = lb, ub
+        self.trace.append((at - self.start_time, lb, ub))
+
+
+def run_with_deadline(target, args, timeout, initializer=None, initargs=(), instrument=True):
+    """
+    Calls target(*args) in a new process (after initializer(*initargs)), killing it after
+    timeout seconds. Without instrument, the job only follows its incumbents (see
+    src.stats.collect).
+
+    :return: (status, value, incumbents), where status is 'finished', 'timeout' or 'failed',
+        value the return value of target (None on timeout, the traceback or exit code when it
+        failed) and incumbents its Incumbents.
+    """
+    ctx = mp.get_context('forkserver')
+    messages = ctx.Queue()
+    start_time = time()
+    process = ctx.Process(target=_run, args=(target, args, initializer, initargs, instrument,
+        messages))
+    process.start()
+    incumbents, deadline = Incumbents(start_time), start_time + timeout
+    status, value = 'timeout', None
+    while time() < deadline:
+        alive = process.is_alive() # Checked first: a dead process has sent all its messages
+        try:
+            kind, message = messages.get(timeout=min(1.0, max(0.0, deadline - time())))
+        except queue.Empty:
+            if not alive:
+                status, value = 'failed', f'Exited with code {process.exitcode}'
+                break
+            continue
+        if kind == 'start':
+            incumbents.start_time = message
+            continue
+        if kind == 'result':
+            process.join()
+            incumbents.elapsed = time() - start_time
+            return 'finished', message, incumbents
+        if kind == 'error':
+            status, value = 'failed', message
+            break
+        incumbents.add(*message)
+
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass # The whole group already exited
+    process.join()
+    incumbents.elapsed = time() - start_time
+    return status, value, incumbents
@@ -0,0 +1,64 @@
+"""
+Anytime performance metrics computed from the (time, LB, UB) traces of src.stats.
+"""
+
+def primal_gap(value, best):
+    """
+    Primal gap in [0, 1] of an incumbent value w.r.t. the best known value (1 without one).
+    """
+    if value is None or best is None:
+        return 1.0
+    if value == best:
+        return 0.0
+    if value * best < 0:
+        return 1.0
+    return abs(best - value) / max(abs(best), abs(value))
+
+def time_to_target(trace, best, gap=0.01):
+    """
+    First time at which the incumbent is within a relative gap of the best known value
+    (None if it never gets there).
+    """
+    for t, lb, _ in trace:
+        if primal_gap(lb, best) <= gap:
+            return t
+    return None
+
+def primal_integral(trace, best, horizon):
+    """
+    Integral of the primal gap over [0, horizon]: small values mean good solutions found
+    early. The gap is 1 until the first incumbent.
+    """
+    integral, last_t, last_gap = 0.0, 0.0, 1.0
+    for t, lb, _ in trace:
+        t = min(t, horizon)
+        integral += (t - last_t) * last_gap
+        last_t, last_gap = t, primal_gap(lb, best)
+    return integral + (horizon - last_t) * last_gap
+
+def add_summaries(rows, horizon, gaps=(0.01, 0.05)):
+    """
+    Adds, in place, time-to-target and primal integral columns to runner rows. The best
+    known value of an instance is the best LB of its rows.
+
+    ### Parameters:
+        :rows: result rows, with the instance columns (N, M, d, idx), LB and trace.
+        :horizon: time limit of the runs, the end of the primal integral.
+        :gaps: relative gaps of the time-to-target columns (ttt_<gap in %>).
+    """
+    best = {}
+    for row in rows:
+        key = (row['N'], row['M'], row['d'], row['idx'])
+        if row['LB'] is not None: # None - Killed before any incumbent
+            best[key] = max(best.get(key, row['LB']), row['LB'])
+    for row in rows:
+        value, trace = best.get((row['N'], row['M'], row['d'], row['idx'])), row.get('trace') or []
+        if not trace and row['LB'] is not None:
+            # No trace of its incumbents (e.g. an older uninstrumented row): unknown, rather
+            # than the worst case
+            row.update({f'ttt_{gap * 100:g}': None for gap in gaps}, primal_integral=None)
+            continue
+        for gap in gaps:
+            row[f'ttt_{gap * 100:g}'] = time_to_target(trace, value, gap)
+        row['primal_integral'] = primal_integral(trace, value, horizon)
+    return rows
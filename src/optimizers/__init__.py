@@ -5,3 +5,5 @@ from .non_linear_warm_start import MINLPWarmStartOptimizer
 from .greedy_heuristic import GreedyHeuristicOptimizer
 from .grasp import GRASPOptimizer
 from .genetic_algorithm import GAOptimizer
+from .coordinate_ascent import CoordinateAscentOptimizer
+from .portfolio import PortfolioOptimizer
\ No newline at end of file
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
 from time import time
+from src import stats
 from src.problem import Result
 
 class BaseOptimizer(ABC):
@@ -8,13 +9,17 @@ class BaseOptimizer(ABC):
     def __init__(self):
         pass
 
-    def solve(self, smbpp, timeout, seed, verbose, **kwargs) -> Result:
+    def solve(self, smbpp, timeout, seed, verbose, instrument=True, **kwargs) -> Result:
         """Abstract method to optimize.
+        With instrument, the result also gets the counters and timers of src.stats.
         """
-        start_time = time()
-        result = self._solve(smbpp, timeout, seed, verbose, **kwargs)
-        result['time'] = time() - start_time
-        result['is_valid'] = smbpp.validate_current_solution()
+        with stats.collect(instrument) as run_stats:
+            start_time = time()
+            result = self._solve(smbpp, timeout, seed, verbose, **kwargs)
+            result['time'] = time() - start_time
+            with run_stats.timer('validate_time'):
+                result['is_valid'] = smbpp.validate_current_solution()
+            result.update(run_stats.summary())
         return result
     
     @abstractmethod
@@ -0,0 +1,63 @@
+"""
+Upper bounds on the optimal revenue, reported by the heuristics as their UB and used to stop
+them once their incumbent is close enough.
+"""
+
+import numpy as np
+import scipy.sparse as sp
+from src import stats
+from src.solvers import get_model
+from src.problem import bounds as bnd
+
+BOUNDS = (None, 'lp')
+
+def lp_bound(smbpp, backend='gurobi'):
+    """
+    LP relaxation of the MILPOptimizer formulation, with the buy decisions projected out:
+    the revenue r_j of client j is at most the concave envelope of its revenue function,
+        r_j <= S_j p  and  (M_j - b_j) r_j + b_j S_j p <= b_j M_j,
+    where M_j bounds the cost of its bundle. It is also the value of the Lagrangian dual
+    that relaxes the linking of each client's cost to the prices.
+
+    It is weak: on the instances/ set it is within 0.1-1.5% of the sum of the budgets, far
+    above the best known revenues, so the heuristics do not compute it by default.
+    """
+    m, n = smbpp.n_clients, smbpp.n_product
+    u = bnd.price_bounds(smbpp)
+    budgets = smbpp.budgets.astype(np.float64)
+    costs_bound = np.maximum(bnd.bundle_bounds(smbpp, u), budgets)
+
+    model = get_model(backend)
+    model.add_vars(n, ub=u)
+    revenues = model.add_vars(m, ub=budgets)
+    objective = np.zeros(n + m)
+    objective[revenues] = smbpp.weights
+    model.set_objective(objective, maximize=True)
+    model.add_constrs(sp.hstack([-smbpp.bundles, sp.identity(m)]), '<', 0.0)
+    model.add_constrs(sp.hstack([sp.diags(budgets) @ smbpp.bundles,
+        sp.diags(costs_bound - budgets)]), '<', budgets * costs_bound)
+    model.optimize()
+    return model.obj_val()
+
+def upper_bound(smbpp, method='lp', backend='gurobi'):
+    """
+    Upper bound on the optimal revenue.
+
+    ### Parameters:
+        :method: (None - Sum of the budgets, 'lp' - lp_bound).
+        :backend: LP solver backend ('gurobi' or 'highs').
+    """
+    if method not in BOUNDS:
+        raise ValueError(f'Unknown upper bound: {method}')
+    with stats.current().timer('bound_time'):
+        bound = smbpp.get_maximum_revenue()
+        if method == 'lp':
+            bound = min(bound, lp_bound(smbpp, backend))
+    return bound
+
+def gap_closed(value, bound, gap):
+    """
+    Whether the incumbent value is within the relative gap of the bound (never when gap is
+    None).
+    """
+    return gap is not None and bound - value <= gap * max(1.0, abs(bound))
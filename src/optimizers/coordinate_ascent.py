@@ -0,0 +1,129 @@
+import numpy as np
+from time import time
+from .base import BaseOptimizer
+from src import stats
+from src.problem import Result
+
+class CoordinateAscentOptimizer(BaseOptimizer):
+    def _solve(self, smbpp, timeout, seed, verbose, passes=100, restarts=10, **kwargs):
+        """
+        Maximizes the revenue by coordinate ascent over the prices, without any LP solve.
+
+        For fixed other prices, the revenue as a function of one price p_i is piecewise linear,
+        with breakpoints at the budgets left by each client whose bundle contains i. Each step
+        sets p_i to its exact optimum by sorting and sweeping those breakpoints.
+
+        ### Parameters:
+            :passes: maximum number of sweeps over all products per start.
+            :restarts: number of starts (the first one from uniform prices, the others from a
+                random perturbation of the best prices found so far).
+        """
+        if verbose: print('CoordinateAscentOptimizer')
+        start_time = time()
+        rng = np.random.default_rng(seed)
+
+        # Inverted index product -> clients (CSC form of the bundle matrix)
+        by_product = smbpp.bundles.tocsc()
+        by_product.sort_indices()
+
+        best_cost, best_p = -1.0, np.zeros(smbpp.n_product)
+        for r in range(restarts):
+            p = np.ones(smbpp.n_product) if r == 0 else best_p * rng.uniform(0.5, 1.5, smbpp.n_product)
+            cost = coordinate_ascent(smbpp, by_product, p, passes, rng, start_time, timeout)
+            if cost > best_cost:
+                best_cost, best_p = cost, p
+                stats.current().incumbent(best_cost, smbpp.get_maximum_revenue())
+            if verbose == 2 or verbose == 1 and r % 10 == 0:
+                print(f"\tStart: {r}, BestSol = {best_cost}")
+            if time() - start_time > timeout: break
+
+        costs = smbpp.bundle_costs(best_p)
+        smbpp.set_prices(best_p.tolist())
+        smbpp.set_clients_decision(buyers(costs, smbpp.budgets).astype(int).tolist())
+
+        result = Result()
+        result['name'] = self.__class__.__name__
+        result['LB'] = smbpp.current_cost()
+        result['UB'] = smbpp.get_maximum_revenue()
+        return result
+
+def buyers(costs, budgets, tol=1e-9):
+    """
+    Each client buys its bundle whenever it fits in its budget.
+    """
+    return costs <= budgets + tol
+
+def best_price(others, budgets, weights):
+    """
+    Exact optimum of one product price given, for each client containing the product,
+    the cost of the rest of its bundle (others), its budget and its weight.
+
+    :return: (price, revenue obtained from these clients)
+    """
+    # Highest price for which each client still buys
+    limits = budgets - others
+    valid = limits >= 0
+    if not np.any(valid):
+        return 0.0, 0.0
+    limits, others, weights = limits[valid], others[valid], weights[valid]
+    order = np.argsort(-limits, kind='stable')
+    limits, others, weights = limits[order], others[order], weights[order]
+    # Charging limits[k], the clients 0..k buy
+    revenues = np.cumsum(weights * others) + limits * np.cumsum(weights)
+    k = np.argmax(revenues)
+    return limits[k], revenues[k]
+
+def best_scale(costs, budgets, weights):
+    """
+    Exact optimum of the factor a that multiplies all prices, given the current bundle costs.
+
+    :return: (a, revenue)
+    """
+    valid = costs > 0
+    if not np.any(valid):
+        return 1.0, 0.0
+    costs, budgets, weights = costs[valid], budgets[valid], weights[valid]
+    # Highest factor for which each client still buys
+    limits = budgets / costs
+    order = np.argsort(-limits, kind='stable')
+    limits, costs, weights = limits[order], costs[order], weights[order]
+    revenues = limits * np.cumsum(weights * costs)
+    k = np.argmax(revenues)
+    return limits[k], revenues[k]
+
+def coordinate_ascent(smbpp, by_product, p, passes, rng, start_time, timeout):
+    """
+    Improves the prices p in place until neither a single price change nor scaling all
+    prices improves the revenue.
+
+    :return: revenue of the final prices.
+    """
+    budgets, weights = smbpp.budgets, smbpp.weights
+    run_stats = stats.current()
+    for _ in range(passes):
+        # One evaluation per move: the scaling one and one per product
+        run_stats.add('evaluations', smbpp.n_product + 1)
+        costs = smbpp.bundle_costs(p)
+        improved = False
+        # Scaling move over all prices at once
+        factor, revenue = best_scale(costs, budgets, weights)
+        if revenue > (weights * costs)[buyers(costs, budgets)].sum() + 1e-9:
+            p *= factor
+            costs *= factor
+            improved = True
+
+        for i in rng.permutation(smbpp.n_product):
+            clients = by_product.indices[by_product.indptr[i]:by_product.indptr[i+1]]
+            if len(clients) == 0:
+                continue
+            c, w = costs[clients], weights[clients]
+            current = (w * c)[buyers(c, budgets[clients])].sum()
+            price, revenue = best_price(c - p[i], budgets[clients], w)
+            if revenue > current + 1e-9:
+                costs[clients] += price - p[i]
+                p[i] = price
+                improved = True
+        if not improved or time() - start_time > timeout: break
+
+    costs = smbpp.bundle_costs(p)
+    return float((weights * costs)[buyers(costs, budgets)].sum())
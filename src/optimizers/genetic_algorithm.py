@@ -1,83 +1,118 @@
+import queue
+import inspect
+import threading
 import numpy as np
-import random
+import multiprocessing as mp
 from time import time
 from .base import BaseOptimizer
-from src.util import get_gurobi_model
-from src.problem import SMBPP, Result
-from gurobipy import GRB         
-        
+from src import stats
+from .pricing import PricingOracle
+from .bounding import upper_bound, gap_closed
+from src.problem import Result, SMBPP
+from src.solvers import init_worker
+from src.util import gather
+
+def _run_island(island, instance, kwargs, deadline, inbox, outbox, improvements, results,
+                migration_interval, migration_size):
+    """
+    Runs one island of GAOptimizer.evolve in a worker process. Every migration_interval
+    generations it sends its best migration_size chromosomes to the next island and replaces
+    its worst parents by the ones the previous island sent, if any: it never waits for them,
+    as the previous island may be behind or already stopped. Each new incumbent is sent to
+    the improvements queue.
+    """
+    init_worker(kwargs['backend'], 1)
+    outbox.cancel_join_thread()
+    improvements.cancel_join_thread()
+    ga = GAOptimizer()
+
+    def migrate(ga):
+        outbox.put((ga.pop[:migration_size].copy(), ga.fitness[:migration_size].copy()))
+        try:
+            pop, fitness = inbox.get_nowait()
+        except queue.Empty:
+            return
+        worst = slice(ga.pop_size - len(pop), ga.pop_size)
+        ga.pop[worst], ga.fitness[worst] = pop, fitness
+        order = np.argsort(-ga.fitness[:ga.pop_size], kind='stable')
+        ga.pop[:ga.pop_size], ga.fitness[:ga.pop_size] = ga.pop[order], ga.fitness[order]
+
+    def on_improve(lb, ub, x):
+        if x is not None:
+            improvements.put((time(), lb, np.array(x, dtype=np.uint8)))
+
+    stats.reset() # The parent's run, inherited through fork, is not this island's
+    with stats.collect() as run_stats:
+        run_stats.on_improve = on_improve
+        ga.evolve(SMBPP.from_csr(*instance), max(0.0, deadline - time()), migrate=migrate,
+                  migration_interval=migration_interval, **kwargs)
+        results.put((island, float(ga.fitness[0]), ga.pop[0].copy(), dict(run_stats.counters),
+                     ga.cache_info))
+
 
 class GAOptimizer(BaseOptimizer):
 
-    def _solve(self, smbpp, timeout, seed, verbose, **kwargs):
+    def _solve(self, smbpp, timeout, seed, verbose, n_islands=1, **kwargs):
         """
-        Performs a Genetic Algorithm heuristic.
+        Performs a Genetic Algorithm heuristic (on n_islands populations when n_islands > 1,
+        see evolve_islands).
         """
 
         if verbose: print('GAOptimizer')
-        best_cost = self.evolve(smbpp, timeout, seed=seed, verbose=verbose, **kwargs)
+        if n_islands > 1:
+            best_cost = self.evolve_islands(smbpp, timeout, seed=seed, verbose=verbose,
+                                            n_islands=n_islands, **kwargs)
+        else:
+            best_cost = self.evolve(smbpp, timeout, seed=seed, verbose=verbose, **kwargs)
         result = Result()
         result['name'] = self.__class__.__name__
         result['LB'] = best_cost
-        result['UB'] = smbpp.get_maximum_revenue()
+        result['UB'] = self.ub
+        result.update(self.cache_info)
         return result
                     
                     
-    def _initialize_pop(self):
+    def _initialize_pop(self, rows=None):
         """
-        Generates the initial population.
+        Generates random chromosomes in the given rows (the first self.pop_size by default).
         """
-        for i in range(self.pop_size):
-            self.pop[i].initialize()
+        rows = np.arange(self.pop_size) if rows is None else rows
+        self.pop[rows] = self.rng.integers(0, 2, (len(rows), self.smbpp.n_clients), dtype=np.uint8)
+        self.fitness[rows] = np.nan
         
-    def _one_crossover(self, parent1, parent2, child1, child2, point):
+    def _one_crossover(self, parents1, parents2, points):
         """
         Peforms the 1-point crossover.
 
         ### Parameters:
-            :parent1, parent2: parents.
-            :child1, child2: Chromosome objects to stores the results.
-            :point: crossover point.
+            :parents1, parents2: parents (one chromosome per row).
+            :points: crossover point of each pair.
 
-        :return: None
+        :return: (children1, children2)
         """
-        child1.solution[0:point] = parent1.solution[0:point]
-        child1.solution[point:self.smbpp.n_clients] = parent2.solution[point:self.smbpp.n_clients]
-        child1.fitness_value = None
-        
-        child2.solution[0:point] = parent2.solution[0:point]
-        child2.solution[point:self.smbpp.n_clients] = parent1.solution[point:self.smbpp.n_clients]
-        child2.fitness_value = None
+        mask = np.arange(self.smbpp.n_clients) < points[:, None]
+        return np.where(mask, parents1, parents2), np.where(mask, parents2, parents1)
         
     
-    def _uniform_crossover(self, parent1, parent2, child1, child2):
+    def _uniform_crossover(self, parents1, parents2):
         """
-        Peforms the 1-point crossover.
+        Peforms the uniform crossover.
 
         ### Parameters:
-            :parent1, parent2: parents.
-            :child1, child2: Chromosome objects to stores the results.  
+            :parents1, parents2: parents (one chromosome per row).
 
-        :return: None
+        :return: (children1, children2)
         """
-
-        for i in range(self.smbpp.n_clients):
-            if random.random() < 0.5:
-                child1.solution[i], child2.solution[i] = parent1.solution[i], parent2.solution[i]
-            else:
-                child1.solution[i], child2.solution[i] = parent2.solution[i], parent1.solution[i]
-        child1.fitness_value = None
-        child2.fitness_value = None
+        mask = self.rng.random(parents1.shape) < 0.5
+        return np.where(mask, parents1, parents2), np.where(mask, parents2, parents1)
         
-    def _mutation(self, cromo):
+    def _mutation(self, chromosomes):
         """
-        Performs the mutation
+        Performs the mutation, flipping each gene with probability self.mut_rate.
 
         :return: None
         """
-        for i in range(self.smbpp.n_clients):
-            if(random.random() <= self.mut_rate):
-                cromo.solution[i] = 1-cromo.solution[i]
+        chromosomes ^= (self.rng.random(chromosomes.shape) <= self.mut_rate).astype(np.uint8)
                 
     
     def _calculate_fitness(self, beg, end):
@@ -86,9 +121,11 @@ class GAOptimizer(BaseOptimizer):
         
         :return: None
         """
-        for i in range(beg, end+1):
-            if self.pop[i].fitness_value is None: # Computes the fitness only for new chromosomes
-                self.pop[i].fitness(self.smbpp)
+        # Computes the fitness only for new chromosomes (concurrently when n_workers > 1)
+        # The chromosomes not evaluated before the deadline keep a nan fitness (sorted last)
+        new = beg + np.flatnonzero(np.isnan(self.fitness[beg:end+1]))
+        values = self.oracle.optimize_many(list(self.pop[new]), self.deadline)
+        self.fitness[new[:len(values)]] = [value for value, _ in values]
     
                 
     def _roulette_wheel_selection(self):
@@ -98,17 +135,11 @@ class GAOptimizer(BaseOptimizer):
         
         :return: None
         """
-        sum_fitness = 0
-        for i in range(self.pop_size):
-            self.probs[i] = self.pop[i].fitness_value
-            sum_fitness += self.probs[i]
-
         # Computes the probability of each chromose based on his fitness
-        for i in range(self.pop_size):
-            self.probs[i] /= sum_fitness
+        probs = self.fitness[:self.pop_size] / self.fitness[:self.pop_size].sum()
             
         # Selects the parents based on the probabilities
-        self.parents = np.random.choice(self.pop_size, self.pop_size, p=self.probs)
+        self.parents = self.rng.choice(self.pop_size, self.pop_size, p=probs)
 
 
     def _stochastic_universal_sampling_selection(self):
@@ -118,28 +149,14 @@ class GAOptimizer(BaseOptimizer):
         
         :return: None
         """
-        sum_fitness = 0
-        for i in range(self.pop_size):
-            self.probs[i] = self.pop[i].fitness_value
-            sum_fitness += self.probs[i]
-
         # Computes the probability of each chromose based on his fitness
-        for i in range(self.pop_size):
-            self.probs[i] /= sum_fitness
+        probs = self.fitness[:self.pop_size] / self.fitness[:self.pop_size].sum()
 
-        # Selects the parents based on the probabilities
+        # Selects the parents at self.pop_size equally spaced points
         step = 1.0/self.pop_size
-        current_point = random.uniform(0, step)
-        sum_probs = self.probs[0]
-        i = 0
-        for parent in range(self.pop_size):
-            while sum_probs < current_point:
-                i+=1
-                sum_probs += self.probs[i]
-            self.parents[parent] = i
-            current_point += step
-            
-        self.parents = np.random.permutation(self.parents)
+        points = self.rng.uniform(0, step) + step * np.arange(self.pop_size)
+        parents = np.minimum(np.searchsorted(np.cumsum(probs), points), self.pop_size - 1)
+        self.parents = self.rng.permutation(parents)
 
     def _tournament_selection(self, tournament_size = 4):
         """
@@ -148,9 +165,14 @@ class GAOptimizer(BaseOptimizer):
         
         :return: None
         """
-        for parent in range(self.pop_size):
-            tournament = np.random.choice(self.pop_size, tournament_size, replace = False)
-            self.parents[parent] = max(tournament, key = lambda x: self.pop[x].fitness_value)
+        # Samples the tournaments (tournament_size distinct chromosomes each) by Floyd's method
+        tournaments = np.empty((self.pop_size, tournament_size), dtype=np.int64)
+        for k, j in enumerate(range(self.pop_size - tournament_size, self.pop_size)):
+            t = self.rng.integers(0, j + 1, self.pop_size)
+            repeated = (tournaments[:, :k] == t[:, None]).any(axis=1)
+            tournaments[:, k] = np.where(repeated, j, t)
+        winners = np.argmax(self.fitness[tournaments], axis=1)
+        self.parents = tournaments[np.arange(self.pop_size), winners]
         
     
     def _offspring_generation(self):
@@ -159,20 +181,20 @@ class GAOptimizer(BaseOptimizer):
         
         :return: None
         """
-        for i in range(0, self.pop_size, 2):
-            point = random.randint(1, self.pop_size-1)
-            parent1, parent2 = self.parents[i], self.parents[i+1]
-            if self.uniform_cross:
-                self._uniform_crossover(self.pop[parent1], self.pop[parent2], self.pop[i+self.pop_size], 
-                    self.pop[i+1+self.pop_size])
-            else:
-                self._one_crossover(self.pop[parent1], self.pop[parent2], self.pop[i+self.pop_size], 
-                    self.pop[i+1+self.pop_size], point)
-            self._mutation(self.pop[i+self.pop_size])
-            self._mutation(self.pop[i+1+self.pop_size])
+        parents1, parents2 = self.pop[self.parents[0::2]], self.pop[self.parents[1::2]]
+        if self.uniform_cross:
+            children1, children2 = self._uniform_crossover(parents1, parents2)
+        else:
+            points = self.rng.integers(1, self.smbpp.n_clients, len(parents1), endpoint=False)
+            children1, children2 = self._one_crossover(parents1, parents2, points)
+        children = self.pop[self.pop_size:]
+        children[0::2], children[1::2] = children1, children2
+        self._mutation(children)
+        self.fitness[self.pop_size:] = np.nan
         
        
-    def evolve(self, smbpp, timeout, seed, verbose, num_generations, pop_size, mut_rate, selection_method = 1, uniform_cross = True):
+    def evolve(self, smbpp, timeout, seed, verbose, num_generations, pop_size, mut_rate, selection_method = 1, uniform_cross = True, cache_mb = 64, n_workers = 1,
+               backend = 'gurobi', migrate = None, migration_interval = 10, bound = None, ub = None, target_gap = None):
         """
         Runs the genetic algorithm.
 
@@ -186,32 +208,47 @@ class GAOptimizer(BaseOptimizer):
             :mut_rate: mutation rate.
             :selection_method: (0 - Roullete Wheel, 1 - Stochastic Universal Sampling, 2 - Tournament)
             :uniform_cross: (True - Uniform Crossover, False - One-Point Crossover).
+            :cache_mb: memory cap (MB) of the fitness cache (0 - Disabled).
+            :n_workers: number of processes evaluating the fitness concurrently (1 - Serial).
+            :backend: LP solver backend ('gurobi' or 'highs').
+            :migrate: function called with this object every migration_interval generations
+                (see evolve_islands).
+            :bound: upper bound reported as UB (see src.optimizers.bounding.upper_bound).
+            :ub: value of the upper bound when already known (bound is then not computed).
+            :target_gap: stops once the best fitness is within this relative gap of the bound
+                (None - Never).
 
-        :return: None
+        :return: fitness of the best chromosome
         """
         self.smbpp = smbpp
+        self.oracle = PricingOracle(smbpp, cache_mb=cache_mb, n_workers=n_workers,
+                                    backend=backend)
         self.timeout = timeout
-        self.pop = [Chromosome(self.smbpp.n_clients) for _ in range(2*pop_size)] #Populacao (a 2a metade da lista armazena os filhos)
+        self.pop = np.zeros((2*pop_size, self.smbpp.n_clients), dtype=np.uint8) #Populacao, um cromossomo por linha (a 2a metade armazena os filhos)
+        self.fitness = np.full(2*pop_size, np.nan) #Fitness de cada cromossomo (nan - ainda nao calculado)
         self.mut_rate = mut_rate
-        self.parents = [None]*pop_size #Armazena os indices dos pais para reproducao
-        self.probs = [None]*pop_size #Armazena as probabilidades para o metodo da roleta
+        self.parents = np.zeros(pop_size, dtype=np.int64) #Armazena os indices dos pais para reproducao
         self.pop_size = pop_size
         self.num_generations = num_generations
         self.uniform_cross = uniform_cross
         self.verbose = verbose
         self.selection_method = selection_method
-        random.seed(seed)
-        np.random.seed(seed)
+        self.rng = np.random.default_rng(seed)
+        self.ub = upper_bound(smbpp, bound, backend) if ub is None else ub
         
         gen = 0 #Generation index        
         start_time = time()
+        self.deadline = start_time + timeout
         best_sol = -1 #Cost of the incumbent solution
         best_time = 0 #Time when the incumbent solution was found
         n_no_improvements = 0 #Number of consecutive generations without improvement
         
         self._initialize_pop()
-        while(gen < self.num_generations and time() - start_time < self.timeout):
+        run_stats = stats.current()
+        while(gen < self.num_generations and time() - start_time < self.timeout
+              and not run_stats.proven_optimal() and not gap_closed(best_sol, self.ub, target_gap)):
             self._calculate_fitness(0, self.pop_size-1) #Calcula o fitness dos pais (quando necessario)
+            if time() > self.deadline: break
             
             if selection_method == 0:
                 self._roulette_wheel_selection()
@@ -223,80 +260,135 @@ class GAOptimizer(BaseOptimizer):
             self._calculate_fitness(self.pop_size, 2*self.pop_size-1)
             # Sorts the chromosomes so that the 1st half of self.pop (the new generation)
             # contains the best chromosomes
-            self.pop.sort(reverse=True, key = lambda x: x.fitness_value) 
+            order = np.argsort(-self.fitness, kind='stable')
+            self.pop, self.fitness = self.pop[order], self.fitness[order]
             
             n_no_improvements += 1
             # New incument solution
-            if self.pop[0].fitness_value > best_sol:
-                best_sol = self.pop[0].fitness_value
+            if self.fitness[0] > best_sol:
+                best_sol = self.fitness[0]
                 best_time = time()-start_time
+                run_stats.incumbent(best_sol, self.ub, solution=self.pop[0])
                 n_no_improvements = 0
             
-            # Re-initialize 10 chromosomes if no improve was found in the last 10 generations
+            # Re-initialize 20% of the parents (out of the best 40%) if no improve was found in
+            # the last 10 generations
             if n_no_improvements == 10:
-                if verbose == 2: print("\n\tRestarting 10 chromosomes\n")
-                indexes = np.random.choice(np.arange(20, 50), 10, replace = False)
-                for i in indexes:
-                    self.pop[i].initialize()
+                if verbose == 2: print(f"\n\tRestarting {self.pop_size // 5} chromosomes\n")
+                self._initialize_pop(self.rng.choice(np.arange(2 * self.pop_size // 5, self.pop_size),
+                    self.pop_size // 5, replace = False))
                 n_no_improvements = 0
             
             # Prints the best fitness
             if(self.verbose == 1 and gen % 10 == 0 or self.verbose == 2):
-                print("\n\tGeneration ", gen, " Best Fitness: ", self.pop[0].fitness_value)
+                print("\n\tGeneration ", gen, " Best Fitness: ", self.fitness[0])
                 if verbose == 2:
                     print("\tTop 10:")
                     for i in range(10):
-                        print("\t", self.pop[i].fitness_value)
+                        print("\t", self.fitness[i])
                     print("\tBest time", best_time)
             
             gen += 1
+            if migrate is not None and gen % migration_interval == 0:
+                migrate(self)
+        # Leaves the best solution in the instance (the last generation may be partly evaluated,
+        # or not at all when the deadline passed first: the value priced here is returned)
+        order = np.argsort(-self.fitness, kind='stable')
+        self.pop, self.fitness = self.pop[order], self.fitness[order]
+        self.fitness[0], prices = self.oracle.optimize(self.pop[0])
+        run_stats.incumbent(self.fitness[0], self.ub, solution=self.pop[0])
+        smbpp.set_clients_decision(self.pop[0].tolist())
+        smbpp.set_prices(prices)
+        self.cache_info = self.oracle.cache_info()
+        self.oracle.close()
         print('Best time: ', best_time)
-        return self.pop[0].fitness_value
+        return float(self.fitness[0])
 
-
-class Chromosome:
-    
-    def __init__(self, n_clients):
-        
-        self.solution = [None]*n_clients # Clients decisions
-        self.fitness_value = None # Stores the value of the objective function
-        
-    def initialize(self):
-        """
-        Initializes the chromosome with random values.
-        """
-        for i in range(len(self.solution)):
-            self.solution[i] = random.randint(0,1)
-                        
-    def fitness(self, smbpp):
+    def evolve_islands(self, smbpp, timeout, seed, verbose, n_islands, islands = None,
+                       migration_interval = 10, migration_size = 2, backend = 'gurobi', bound = None,
+                       **kwargs):
         """
-        Calculates the chromosome fitness.
-        """
-        smbpp.set_clients_decision(self.solution)
-        self.fitness_value, _ = self._optimize(smbpp, 0)
-        return self.fitness_value
+        Runs n_islands populations (see evolve) in separate processes, connected in a ring:
+        every migration_interval generations, each island sends its best migration_size
+        chromosomes to the next one, which replaces its worst parents by them.
 
-    def _optimize(self, smbpp: SMBPP, verbose: int):
-        """
-        Given the clients that must be satisfied, it computes the best prices.
+        ### Parameters:
+            :n_islands: number of islands (processes).
+            :islands: list of dicts overriding the evolve parameters of each island
+                (e.g. selection_method, uniform_cross), used cyclically. The parameters set
+                by evolve_islands itself (seed, verbose, backend, migration) are rejected.
+            :migration_interval: generations between migrations.
+            :migration_size: number of chromosomes sent by each island per migration.
+            :kwargs: evolve parameters shared by all islands. Islands evaluate their fitness
+                serially (n_workers must be 1).
+
+        :return: fitness of the best chromosome
         """
-        model = get_gurobi_model(verbose=verbose)
+        if kwargs.get('n_workers', 1) != 1:
+            raise ValueError('GA islands evaluate their fitness serially: n_workers must be 1')
+        # Checked here: an island with invalid parameters would die without reporting
+        reserved = {'smbpp', 'timeout', 'seed', 'verbose', 'backend', 'migrate',
+                    'migration_interval', 'ub'}
+        valid = set(inspect.signature(self.evolve).parameters) - reserved
+        invalid = set(kwargs).union(*(islands or [])) - valid
+        if invalid:
+            raise TypeError(f'Invalid GA island parameters: {", ".join(sorted(invalid))}')
+        deadline = time() + timeout
+        self.ub = upper_bound(smbpp, bound, backend)
+        instance = (smbpp.n_product, smbpp.n_clients, smbpp.indptr, smbpp.indices,
+                    smbpp.budgets, smbpp.weights)
+        seeds = np.random.SeedSequence(seed).generate_state(n_islands).tolist()
 
-        # Variables: Prices
-        prices = model.addVars(smbpp.n_product, vtype=GRB.CONTINUOUS, name="prices")
+        ctx = mp.get_context()
+        inboxes = [ctx.Queue() for _ in range(n_islands)]
+        improvements, results = ctx.Queue(), ctx.Queue()
 
-        # Set objective function
-        model.setObjective(
-            SMBPP.objective_function(prices, smbpp.get_clients_decision(), smbpp.clients),
-            GRB.MAXIMIZE
-        )
+        # Reports the islands' incumbents as they are found (e.g. to src.executor)
+        run_stats, done = stats.current(), threading.Event()
+        def collect():
+            while not done.is_set():
+                try:
+                    at, value, x = improvements.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                run_stats.incumbent(value, self.ub, at=at, solution=x)
+        collector = threading.Thread(target=collect, daemon=True)
+        collector.start()
 
-        # Add constraints
-        model.addConstrs(
-            (c for c in SMBPP.constraints_gen(prices, smbpp.get_clients_decision(), smbpp.clients, True))
-        )
+        processes = []
+        try:
+            for k in range(n_islands):
+                island_kwargs = dict(kwargs, seed=seeds[k], verbose=verbose if k == 0 else 0,
+                                     backend=backend, ub=self.ub, **(islands[k % len(islands)] if islands else {}))
+                processes.append(ctx.Process(target=_run_island, args=(k, instance, island_kwargs,
+                    deadline, inboxes[k], inboxes[(k + 1) % n_islands], improvements, results,
+                    migration_interval, migration_size)))
+                processes[-1].start()
+            # An island that died does not report: give up a minute after the deadline
+            island_results = sorted(gather(results, processes, max(0.0, deadline - time()) + 60),
+                                    key=lambda island: island[0])
+        finally:
+            done.set()
+            collector.join()
+            for process in processes:
+                process.terminate()
+                process.join()
+        if not island_results:
+            raise RuntimeError('No island of the GA finished')
+
+        # Merges the islands' counters and cache statistics
+        for _, _, _, counters, _ in island_results:
+            for name, value in counters.items():
+                run_stats.add(name, value)
+        self.cache_info = {key: sum(island[4][key] for island in island_results)
+                           for key in ('cache_hits', 'cache_misses')}
+
+        # Leaves the best solution in the instance
+        _, best_cost, best, _, _ = max(island_results, key=lambda island: island[1])
+        run_stats.incumbent(best_cost, self.ub, solution=best)
+        oracle = PricingOracle(smbpp, cache_mb=0, backend=backend)
+        _, prices = oracle.optimize(best)
+        smbpp.set_clients_decision(best.tolist())
+        smbpp.set_prices(prices)
+        return best_cost
 
-        # Solve the model
-        model.optimize()
-        
-        return model.objVal, model.getAttr('x', prices).values()
\ No newline at end of file
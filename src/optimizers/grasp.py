@@ -1,62 +1,114 @@
 import random
-from gurobipy import GRB
+import numpy as np
 from .base import BaseOptimizer
-from src.util import get_gurobi_model
-from src.problem import SMBPP, Result
+from src import stats
+from .pricing import PricingOracle
+from .bounding import upper_bound, gap_closed
+from src.problem import Result
+from src.problem.bounds import bundle_bounds
 from time import time
 
+# Moves whose revenue bound does not exceed the current revenue by more than this are skipped
+EPS = 1e-6
+
 class GRASPOptimizer(BaseOptimizer):
-    def _solve(self, smbpp, timeout, seed, verbose, **kwargs):
+    def _solve(self, smbpp, timeout, seed, verbose, cache_mb=64, n_workers=1, backend='gurobi',
+               bound=None, target_gap=None, **kwargs):
         """
-        Performs a Greedy Randomized Adaptive Search Procedure
+        Performs a Greedy Randomized Adaptive Search Procedure.
+        With n_workers > 1, candidates and neighborhoods are evaluated on a pool of processes.
+        It reports the upper bound of src.optimizers.bounding (bound) and stops once within
+        target_gap of it.
         """
 
         if verbose: print('GRASPOptimizer')
-        best_cost = grasp(smbpp, timeout, seed=seed, verbose=verbose, **kwargs)
+        oracle = PricingOracle(smbpp, cache_mb=cache_mb, n_workers=n_workers, backend=backend)
+        ub = upper_bound(smbpp, bound, backend)
+        best_cost = grasp(smbpp, oracle, timeout, seed=seed, verbose=verbose, ub=ub,
+                          target_gap=target_gap, **kwargs)
+        oracle.close()
         result = Result()
         result['name'] = self.__class__.__name__
         result['LB'] = best_cost
-        result['UB'] = smbpp.get_maximum_revenue()
+        result['UB'] = ub
+        result.update(oracle.cache_info())
         return result
 
-def grasp(smbpp, timeout, iterations, alpha, seed, verbose):
+def grasp(smbpp, oracle, timeout, iterations, alpha, seed, verbose, ub=None, target_gap=None):
     start_time = time()
     random.seed(seed)
     best_S, best_cost = [], 0
+    costs_bound = bundle_bounds(smbpp)
+    ub = smbpp.get_maximum_revenue() if ub is None else ub
     for i in range(iterations):
-        S, cost = constructive_heuristic(smbpp, alpha, start_time, timeout, verbose)
-        S, cost = local_search(smbpp, S, cost, start_time, timeout, verbose)
+        S, cost = constructive_heuristic(smbpp, oracle, alpha, start_time, timeout, verbose)
+        # Also reported before the local search, which may be cut short by a hard deadline
+        stats.current().incumbent(cost, ub, solution=decisions(smbpp, S))
+        S, cost = local_search(smbpp, oracle, S, cost, costs_bound, start_time, timeout, verbose)
         if cost > best_cost:
             best_S, best_cost = S, cost
+            stats.current().incumbent(best_cost, ub, solution=decisions(smbpp, best_S))
         if verbose == 2 or verbose == 1 and i % 10 == 0:
             print(f"\tIter.: {i}, BestSol = {best_cost}")
-        if time() - start_time > timeout: break
+        if (time() - start_time > timeout or stats.current().proven_optimal()
+                or gap_closed(best_cost, ub, target_gap)): break
+
+    # Leaves the best solution in the instance
+    x = [0] * smbpp.n_clients
+    for s in best_S:
+        x[s] = 1
+    _, prices = oracle.optimize(x)
+    smbpp.set_clients_decision(x)
+    smbpp.set_prices(prices)
     return best_cost
 
-def evaluate_candidates(smbpp, CL, S, current_cost):
+def decisions(smbpp, S):
     """
-    Evaluate the incremental cost c(e) for all e in CL
+    Clients decision vector of the solution S (list of clients).
     """
-    # Set all client_decision (x) to zero
-    smbpp.reset_current_solution()
+    x = np.zeros(smbpp.n_clients, dtype=int)
+    x[S] = 1
+    return x
 
-    # Set all elements already in the solution
-    for s in S:
-        smbpp.set_client_decision(s, True)
+def evaluate_candidates(smbpp, oracle, CL, x, current_cost, prices, deadline=None):
+    """
+    Evaluate the incremental cost c(e) for all e in CL, given the clients decision x and
+    its optimal prices. The candidates whose LP was not solved before the deadline are left
+    out.
+
+    Only the candidates whose bundle is more expensive than their budget at the current
+    prices need an LP. The others are evaluated at the current prices, as in the greedy
+    heuristic: c(e) = w_e * (cost of S_e). When S_e has a product that no client of x
+    buys, that product can absorb the slack of e and c(e) = w_e * b_e, which is exact
+    (it meets the dual bound of the move).
+    """
+    CL = np.asarray(CL)
+    bought = np.zeros(smbpp.n_product)
+    bought[smbpp.bundles[np.flatnonzero(x)].indices] = 1
+    # Products no client of x buys can be priced at 0 without changing the revenue
+    bundle_costs = smbpp.bundle_costs(np.asarray(prices) * bought)[CL]
+    budgets, weights = smbpp.budgets[CL], smbpp.weights[CL]
+    has_free = smbpp.bundles[CL] @ (1 - bought) > 0
+    satisfied = bundle_costs <= budgets + EPS
+    costs = np.where(has_free, budgets, bundle_costs) * weights
 
-    # Compute the incremental cost
-    costs = {}
-    for e in CL:
-        smbpp.set_client_decision(e, True)
-        # TODO: verificar se a solução já não atende o cliente e.
-        # Tipo o que é feito no greedy: SMBPP.cost_by_client(smbpp.get_current_prices(), client) >= client['b']...
-        cost, _ = optimize(smbpp, 0)
+    # Compute the incremental cost of the candidates that bind
+    binding = CL[~satisfied].tolist()
+    stats.current().add('screened_moves', len(CL) - len(binding))
+    candidates = []
+    for e in binding:
+        candidates.append(np.array(x))
+        candidates[-1][e] = 1
+    costs = dict(zip(CL.tolist(), costs.tolist()))
+    solved = oracle.optimize_many(candidates, deadline)
+    for e, (cost, _) in zip(binding, solved):
         costs[e] = cost - current_cost
-        smbpp.set_client_decision(e, False)
+    for e in binding[len(solved):]:
+        del costs[e]
 
     return costs   
 
-def constructive_heuristic(smbpp, alpha, start_time, timeout, verbose = 0):
+def constructive_heuristic(smbpp, oracle, alpha, start_time, timeout, verbose = 0):
     # Create the candidate list
     CL = [j for j in range(smbpp.n_clients)]
     # Create empty RCL
@@ -64,6 +116,8 @@ def constructive_heuristic(smbpp, alpha, start_time, timeout, verbose = 0):
     # Start with empty solution
     current_cost = 0
     S = []
+    x = np.zeros(smbpp.n_clients, dtype=int)
+    prices = np.zeros(smbpp.n_product)
 
     iter = 0
     while CL:
@@ -71,15 +125,17 @@ def constructive_heuristic(smbpp, alpha, start_time, timeout, verbose = 0):
             print("\t\tConstructive heuristic iteration: ", iter, " Current cost: ", current_cost, 
                 " CL length: ", len(CL))
         # Evaluate the incremental cost c(e) for all e in CL
-        costs = evaluate_candidates(smbpp, CL, S, current_cost)
+        costs = evaluate_candidates(smbpp, oracle, CL, x, current_cost, prices,
+                                    start_time + timeout)
+        if not costs: break # The deadline passed before any candidate was evaluated
 
         # Compute cost min and max
         c_min = min(costs.values())
         c_max = max(costs.values())
 
         # Build RCL
-        for e in CL:
-            if costs[e] >= c_min + alpha * (c_max - c_min):
+        for e, cost in costs.items():
+            if cost >= c_min + alpha * (c_max - c_min):
                 RCL.append(e)
 
         # Will stop when we reach timeout, we have no element in the RCL or no improve
@@ -88,9 +144,10 @@ def constructive_heuristic(smbpp, alpha, start_time, timeout, verbose = 0):
         # Select an element s from the RCL at random
         s = random.choice(RCL)
         RCL = []
-        # Add s to the solution
+        # Add s to the solution and re-solve once for its prices
         S += [s]
-        current_cost += costs[s]
+        x[s] = 1
+        current_cost, prices = oracle.optimize(x)
         # Update candidate set
         CL.remove(s)
         iter += 1
@@ -99,7 +156,33 @@ def constructive_heuristic(smbpp, alpha, start_time, timeout, verbose = 0):
 
     return S, current_cost
 
-def local_search(smbpp, best_sol, cost, start_time, timeout, verbose = 0):
+def move_bounds(smbpp, oracle, x, costs_bound):
+    """
+    Upper bounds on the revenue after adding or removing each client, from the duals y of
+    the pricing LP of x. With p' the best prices after the move and M_j >= S_j p' a bound on
+    the cost of bundle j, weak duality gives
+        adding e:    cost + w_e b_e
+        removing r:  cost - y_r b_r + max(y_r - w_r, 0) M_r
+    and an exchange (add e, remove r) is bounded by the sum of both changes.
+
+    :return: (add, remove) arrays with the revenue change bound of each client.
+    """
+    y = oracle.duals(x)
+    add = smbpp.weights * smbpp.budgets
+    remove = -y * smbpp.budgets + np.maximum(y - smbpp.weights, 0) * costs_bound
+    return add, remove
+
+def screen_moves(gains):
+    """
+    Indices of the moves whose bound on the revenue change may improve the solution, by
+    decreasing bound. The others are counted as screened (skipped without an LP).
+    """
+    gains = np.asarray(gains, dtype=np.float64)
+    kept = np.flatnonzero(gains > EPS)
+    stats.current().add('screened_moves', len(gains) - len(kept))
+    return kept[np.argsort(-gains[kept], kind='stable')].tolist()
+
+def local_search(smbpp, oracle, best_sol, cost, costs_bound, start_time, timeout, verbose = 0):
     # Initialize the solution
     smbpp.reset_current_solution()
     for s in best_sol:
@@ -114,18 +197,19 @@ def local_search(smbpp, best_sol, cost, start_time, timeout, verbose = 0):
     best_cost = -1
     
     iter = 0
-    while best_cost < cost and time() - start_time <= timeout:
+    while best_cost < cost and time() - start_time <= timeout and not stats.current().proven_optimal():
         best_cost = cost
         in_cand, out_cand = None, None
         if verbose == 2:
             print("\t\tLocal search iteration: ", iter, " Best cost: ", best_cost)
 
-        #Explore the neighborhoods
-        cost, in_cand = add_neighborhood(smbpp, best_sol, best_cost, in_candidates, start_time, timeout)
+        #Explore the neighborhoods, skipping the moves that cannot improve
+        gains = move_bounds(smbpp, oracle, smbpp.get_clients_decision(), costs_bound)
+        cost, in_cand = add_neighborhood(smbpp, oracle, best_sol, best_cost, in_candidates, start_time, timeout, gains)
         if best_cost >= cost:
-            cost, out_cand = remove_neighborhood(smbpp, best_sol, best_cost, start_time, timeout)
+            cost, out_cand = remove_neighborhood(smbpp, oracle, best_sol, best_cost, start_time, timeout, gains)
         if best_cost >= cost:
-            cost, in_cand, out_cand = exchange_neighborhood(smbpp, best_sol, best_cost, in_candidates, start_time, timeout)
+            cost, in_cand, out_cand = exchange_neighborhood(smbpp, oracle, best_sol, best_cost, in_candidates, start_time, timeout, gains)
         
         #Perform the changes in the solution
         if out_cand is not None:
@@ -136,73 +220,64 @@ def local_search(smbpp, best_sol, cost, start_time, timeout, verbose = 0):
             best_sol.append(in_cand)
         iter += 1
 
-    return best_sol, best_cost
+    return best_sol, max(best_cost, cost)
 
-def add_neighborhood(smbpp, S, cost, in_candidates, start_time, timeout):
+def add_neighborhood(smbpp, oracle, S, cost, in_candidates, start_time, timeout, gains):
     """
-    Performs a first improving search adding a new client in the solution
+    Performs a first improving search adding a new client in the solution, trying the
+    clients by decreasing bound (see move_bounds)
     """ 
-    for cand in in_candidates:
-        smbpp.set_client_decision(cand, True)
-        new_cost, _ = optimize(smbpp, 0)
-        if new_cost > cost:
-            return new_cost, cand
-        smbpp.set_client_decision(cand, False)
-        if time() - start_time > timeout: break
-    return cost, None
-
-def remove_neighborhood(smbpp, S, cost, start_time, timeout):
-    """
-    Performs a first improving search removing a client from the solution
-    """
-    for cand in S:
-        smbpp.set_client_decision(cand, False)
-        new_cost, _ = optimize(smbpp, 0)
-        if new_cost > cost:
-            return new_cost, cand
-        smbpp.set_client_decision(cand, True)
-        if time() - start_time > timeout: break
-    return cost, None
-
-def exchange_neighborhood(smbpp, S, cost, in_candidates, start_time, timeout):
-    """
-    Performs a first improving search exchanging a client in the solutio by a client out of the solution
-    """
-    for in_cand in in_candidates:
-        for out_cand in S:
-            smbpp.set_client_decision(in_cand, True)
-            smbpp.set_client_decision(out_cand, False)
-            new_cost, _ = optimize(smbpp, 0)
-            if new_cost > cost:
-                return new_cost, in_cand, out_cand
-            smbpp.set_client_decision(out_cand, True)
-        smbpp.set_client_decision(in_cand, False)
-        if time() - start_time > timeout: break
-    return cost, None, None
-
+    x = smbpp.get_clients_decision()
+    moves = [in_candidates[k] for k in screen_moves(gains[0][in_candidates])]
+    def neighbors():
+        for cand in moves:
+            y = list(x)
+            y[cand] = 1
+            yield y
 
+    found = oracle.first_improving(neighbors(), cost, start_time + timeout)
+    if found is None:
+        return cost, None
+    k, new_cost = found
+    return new_cost, moves[k]
 
-def optimize(smbpp: SMBPP, verbose: int):
+def remove_neighborhood(smbpp, oracle, S, cost, start_time, timeout, gains):
     """
-    Given the clients that must be satisfied, it computes the best prices.
+    Performs a first improving search removing a client from the solution, trying the
+    clients by decreasing bound (see move_bounds)
     """
-    model = get_gurobi_model(verbose=verbose)
-
-    # Variables: Prices
-    prices = model.addVars(smbpp.n_product, vtype=GRB.CONTINUOUS, name="prices")
+    x = smbpp.get_clients_decision()
+    moves = [S[k] for k in screen_moves(gains[1][S])]
+    def neighbors():
+        for cand in moves:
+            y = list(x)
+            y[cand] = 0
+            yield y
 
-    # Set objective function
-    model.setObjective(
-        SMBPP.objective_function(prices, smbpp.get_clients_decision(), smbpp.clients),
-        GRB.MAXIMIZE
-    )
+    found = oracle.first_improving(neighbors(), cost, start_time + timeout)
+    if found is None:
+        return cost, None
+    k, new_cost = found
+    return new_cost, moves[k]
 
-    # Add constraints
-    model.addConstrs(
-        (c for c in SMBPP.constraints_gen(prices, smbpp.get_clients_decision(), smbpp.clients, True))
-    )
+def exchange_neighborhood(smbpp, oracle, S, cost, in_candidates, start_time, timeout, gains):
+    """
+    Performs a first improving search exchanging a client in the solutio by a client out of the solution,
+    trying the pairs by decreasing bound (see move_bounds)
+    """
+    x = smbpp.get_clients_decision()
+    pair_gains = gains[0][in_candidates][:, None] + gains[1][S][None, :]
+    moves = [divmod(k, len(S)) for k in screen_moves(pair_gains.ravel())]
+    moves = [(in_candidates[k], S[l]) for k, l in moves]
+    def neighbors():
+        for in_cand, out_cand in moves:
+            y = list(x)
+            y[in_cand] = 1
+            y[out_cand] = 0
+            yield y
 
-    # Solve the model
-    model.optimize()
-    
-    return model.objVal, model.getAttr('x', prices).values()
\ No newline at end of file
+    found = oracle.first_improving(neighbors(), cost, start_time + timeout)
+    if found is None:
+        return cost, None, None
+    k, new_cost = found
+    return new_cost, moves[k][0], moves[k][1]
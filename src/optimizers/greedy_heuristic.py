@@ -1,29 +1,34 @@
-from gurobipy import GRB
 from .base import BaseOptimizer
-from src.util import get_gurobi_model
-from src.problem import SMBPP, Result
+from .pricing import PricingOracle
+from .bounding import upper_bound, gap_closed
+from src import stats
+from src.problem import Result
 from time import time
 
 class GreedyHeuristicOptimizer(BaseOptimizer):
-    def _solve(self, smbpp, timeout, seed, verbose, **kwargs):
+    def _solve(self, smbpp, timeout, seed, verbose, cache_mb=64, backend='gurobi', bound=None,
+               target_gap=None, **kwargs):
         """
         Performs a greedy heuristic that is based on adding the solution to the client 
         with the largest possible budget.
+        It reports the upper bound of src.optimizers.bounding (bound) and stops once within
+        target_gap of it.
         """
         if verbose: print('GreedyHeuristicOptimizer')
         best_cost = 0.0
+        oracle = PricingOracle(smbpp, cache_mb=cache_mb, backend=backend)
+        ub = upper_bound(smbpp, bound, backend)
         start_time = time()
-        # Sort client by their budgets
-        smbpp.sort_clients_by_budget()
-        # For each client
-        for j, client in enumerate(smbpp.clients):
+        # For each client, sorted by their budgets
+        for k, j in enumerate(smbpp.clients_by_budget().tolist()):
             # Add client to the solution
             smbpp.set_client_decision(j, True)
             # Check if it is the first client or if the current prioce does not satisfy the 
             # purchase for the current client
-            if j == 0 or SMBPP.cost_by_client(smbpp.get_current_prices(), client) >= client['b']:
+            cost = sum(smbpp.get_current_prices()[i] for i in smbpp.bundle(j).tolist())
+            if k == 0 or cost >= smbpp.budgets[j]:
                 # Get new prrices
-                current_cost, prices = optimize(smbpp)
+                current_cost, prices = oracle.optimize(smbpp.get_clients_decision())
                 # Check if the solution improve
                 if current_cost > best_cost:
                     best_cost = current_cost
@@ -33,36 +38,14 @@ class GreedyHeuristicOptimizer(BaseOptimizer):
             else:
                 # This is great, keep the prices and compute the new revenue
                 best_cost = smbpp.current_cost()
-            if time()-start_time > timeout: break
+            stats.current().incumbent(best_cost, ub, solution=smbpp.get_clients_decision())
+            if (time()-start_time > timeout or stats.current().proven_optimal()
+                    or gap_closed(best_cost, ub, target_gap)): break
 
         result = Result()
         result['name'] = self.__class__.__name__
         result['LB'] = best_cost
-        result['UB'] = smbpp.get_maximum_revenue()
+        result['UB'] = ub
+        result.update(oracle.cache_info())
         return result
 
-
-def optimize(smbpp: SMBPP, verbose: int=0):
-    """
-    Given the clients that must be satisfied, it computes the best prices.
-    """
-    model = get_gurobi_model(verbose=verbose)
-
-    # Variables: Prices
-    prices = model.addVars(smbpp.n_product, vtype=GRB.CONTINUOUS, name="prices")
-
-    # Set objective function
-    model.setObjective(
-        SMBPP.objective_function(prices, smbpp.get_clients_decision(), smbpp.clients),
-        GRB.MAXIMIZE
-    )
-
-    # Add constraints
-    model.addConstrs(
-        (c for c in SMBPP.constraints_gen(prices, smbpp.get_clients_decision(), smbpp.clients, True))
-    )
-
-    # Solve the model
-    model.optimize()
-    
-    return model.objVal, model.getAttr('x', prices).values()
\ No newline at end of file
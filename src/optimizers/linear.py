@@ -1,65 +1,105 @@
-from gurobipy import GRB, quicksum
+import numpy as np
+import scipy.sparse as sp
+from time import time
 from .base import BaseOptimizer
-from src.util import get_gurobi_model
-from src.problem import SMBPP, Result
+from src import stats
+from src.solvers import get_model
+from src.problem import Result, bounds as bnd
 
 class MILPOptimizer(BaseOptimizer):
     def __init__(self):
         self._x = None
         self._p = None
+        self._source = None
 
     def set_warm_start(self, x, p):
         self._x = x
         self._p = p
 
-    def _solve(self, smbpp, timeout, seed, verbose, **kwargs):
+    def set_solution_source(self, source):
+        """
+        Sets a function polled during the solve that returns a new heuristic solution (x, p),
+        or None, to inject as incumbent (see PortfolioOptimizer).
+        """
+        self._source = source
+
+    def _solve(self, smbpp, timeout, seed, verbose, backend='gurobi', dominance=True,
+               **kwargs):
         """
         Find which clients will be satisfied and the best prices using the linear model.
+
+        With dominance, the dominance inequalities of src.problem.bounds are added to the
+        model.
         """
         if verbose: print('MILPOptimizer')
-        model = get_gurobi_model(timeout, verbose)
+        start_time = time()
+        model = get_model(backend, timeout, verbose)
+        m, n = smbpp.n_clients, smbpp.n_product
+        S, I = smbpp.bundles, sp.identity(m, format='csr')
+        budgets = smbpp.budgets.astype(np.float64)
+        bounds = smbpp.get_bundle_bounds()
+        if dominance:
+            pairs = bnd.dominance_pairs(smbpp)
 
         # Variables: Buy decisions, Prices and Revenues 
-        clients_decision = model.addVars(smbpp.n_clients, vtype=GRB.BINARY, name="clients_decision")
-        prices = model.addVars(smbpp.n_product, vtype=GRB.CONTINUOUS, name="prices")
-        revenues = model.addVars(smbpp.n_clients, vtype=GRB.CONTINUOUS, name="revenues")
+        clients_decision = model.add_vars(m, binary=True)
+        prices = model.add_vars(n)
+        revenues = model.add_vars(m, ub=budgets)
+        model.set_incumbent_columns(clients_decision)
+
 
+        def start(x, p):
+            """
+            Values of all the variables for a heuristic solution (x, p).
+            """
+            x, p = np.rint(np.asarray(x, dtype=np.float64)), np.asarray(p, dtype=np.float64)
+            if dominance:
+                # Dominated clients buy
+                x = bnd.close_decisions(x, pairs)
+            return np.concatenate([x, p, smbpp.bundle_costs(p) * x])
 
+        columns = np.concatenate([clients_decision, prices, revenues])
         if self._x and self._p:
             if verbose: print('\tWarm-start is being used')
-            for j in range(smbpp.n_clients):
-                clients_decision[j].start = self._x[j]
-                revenues[j].start = SMBPP.cost_by_client(self._p, smbpp.clients[j]) * self._x[j]
-
-            for i in range(smbpp.n_product):
-                prices[i].start = self._p[i]
+            model.set_start(columns, start(self._x, self._p))
+        if self._source is not None:
+            def source():
+                solution = self._source()
+                return None if solution is None else (columns, start(*solution))
+            model.set_solution_source(source)
 
         # Set objective function
-        model.setObjective(
-            revenues.sum(),
-            GRB.MAXIMIZE,
-        )
+        objective = np.zeros(2 * m + n)
+        objective[revenues] = smbpp.weights
+        model.set_objective(objective, maximize=True)
 
-        # Add constraints
-        for j, client in enumerate(smbpp.clients):
-            model.addConstr(revenues[j] <= client['b'] * clients_decision[j])
-            model.addConstr(revenues[j] <= SMBPP.cost_by_client(prices, client, quicksum))
-            model.addConstr(
-                revenues[j] >= SMBPP.cost_by_client(prices, client, quicksum) - 
-                smbpp.get_bundle_bound(j) * (1 - clients_decision[j])
-            )        
+        # Add constraints, one block of m rows each, over the columns [x | p | r]
+        # r_j <= b_j * x_j
+        model.add_constrs(sp.hstack([-sp.diags(budgets), sp.csr_matrix((m, n)), I]), '<', 0.0)
+        # r_j <= sum_{i in S_j} p_i
+        model.add_constrs(sp.hstack([sp.csr_matrix((m, m)), -S, I]), '<', 0.0)
+        # r_j >= sum_{i in S_j} p_i - M_j * (1 - x_j)
+        model.add_constrs(sp.hstack([-sp.diags(bounds), -S, I]), '>', -bounds)
+        if dominance:
+            # x_j >= x_k for the dominance pairs (j, k)
+            j, k = pairs
+            D = sp.csr_matrix((np.concatenate([-np.ones(len(j)), np.ones(len(k))]),
+                (np.tile(np.arange(len(j)), 2), np.concatenate([j, k]))), shape=(len(j), 2 * m + n))
+            model.add_constrs(D, '<', 0.0)
+        stats.current().add('build_time', time() - start_time)
 
         # Print stats
         if verbose == 2:
-            model.printStats()
+            model.print_stats()
 
         # Solve the model
         model.optimize()
-        smbpp.set_prices(model.getAttr('x', prices).values())
-        smbpp.set_clients_decision(model.getAttr('x', clients_decision).values())
+        smbpp.set_prices(model.get_values(prices).tolist())
+        smbpp.set_clients_decision(model.get_values(clients_decision).tolist())
 
         result = Result()
         result['name'] = self.__class__.__name__
-        result['LB'] = model.objVal
-        result['UB'] = model.ObjBound
+        result['LB'] = model.obj_val()
+        result['UB'] = model.obj_bound()
+        stats.current().incumbent(result['LB'], result['UB'], solution=smbpp.get_clients_decision())
         return result
\ No newline at end of file
@@ -1,7 +1,9 @@
-from gurobipy import GRB
+import numpy as np
+from time import time
 from .base import BaseOptimizer
-from src.util import get_gurobi_model
-from src.problem import SMBPP, Result
+from src import stats
+from src.solvers import get_model
+from src.problem import Result
 
 class MINLPOptimizer(BaseOptimizer):
     def __init__(self):
@@ -12,47 +14,55 @@ class MINLPOptimizer(BaseOptimizer):
         self._x = x
         self._p = p
 
-    def _solve(self, smbpp, timeout, seed, verbose, **kwargs):
+    def _solve(self, smbpp, timeout, seed, verbose, backend='gurobi', **kwargs):
         """
         Find which clients will be satisfied and the best prices using the non-linear model.
         """
         if verbose: print('MINLPOptimizer')
-        model = get_gurobi_model(timeout, verbose)
+        start_time = time()
+        model = get_model(backend, timeout, verbose)
 
         # Variables: Buy decision e Prices 
-        clients_decision = model.addVars(smbpp.n_clients, vtype=GRB.BINARY, name="clients_decision")
-        prices = model.addVars(smbpp.n_product, vtype=GRB.CONTINUOUS, name="prices")
+        clients_decision = model.add_vars(smbpp.n_clients, binary=True)
+        prices = model.add_vars(smbpp.n_product)
+        model.set_incumbent_columns(clients_decision)
 
         if self._x and self._p:
             if verbose: print('\tWarm-start is being used')
-            for j in range(smbpp.n_clients):
-                clients_decision[j].start = self._x[j]
+            model.set_start(clients_decision, self._x)
+            model.set_start(prices, self._p)
 
-            for i in range(smbpp.n_product):
-                prices[i].start = self._p[i]
+        # Bilinear terms x_j * p_i for every i in S_j, taken from the CSR bundle matrix
+        q_rows = clients_decision[np.repeat(np.arange(smbpp.n_clients), np.diff(smbpp.indptr))]
+        q_cols = prices[smbpp.indices]
+        q_vals = np.ones(len(q_rows))
 
-        # Set objective function
-        model.setObjective(
-            SMBPP.objective_function(prices, clients_decision, smbpp.clients),
-            GRB.MAXIMIZE,
+        # Set objective function: sum_j w_j * x_j * sum_{i in S_j} p_i
+        q_weights = np.repeat(smbpp.weights, np.diff(smbpp.indptr))
+        model.set_objective(
+            np.zeros(smbpp.n_clients + smbpp.n_product),
+            maximize=True,
+            q=(q_rows, q_cols, q_weights),
         )
 
-        # Add constraints
-        model.addConstrs(
-            (c for c in SMBPP.constraints_gen(prices, clients_decision, smbpp.clients, False))
-        )
+        # Add constraints: (sum_{i in S_j} p_i - b_j) * x_j <= 0
+        for j, (beg, end) in enumerate(zip(smbpp.indptr[:-1], smbpp.indptr[1:])):
+            model.add_qconstr(q_rows[beg:end], q_cols[beg:end], q_vals[beg:end],
+                [clients_decision[j]], [-smbpp.budgets[j]], '<', 0.0)
+        stats.current().add('build_time', time() - start_time)
 
         # Print stats
         if verbose == 2:
-            model.printStats()
+            model.print_stats()
 
         # Solve the model
         model.optimize()
-        smbpp.set_prices(model.getAttr('x', prices).values())
-        smbpp.set_clients_decision(model.getAttr('x', clients_decision).values())
+        smbpp.set_prices(model.get_values(prices).tolist())
+        smbpp.set_clients_decision(model.get_values(clients_decision).tolist())
 
         result = Result()
         result['name'] = self.__class__.__name__
-        result['LB'] = model.objVal
-        result['UB'] = model.ObjBound
+        result['LB'] = model.obj_val()
+        result['UB'] = model.obj_bound()
+        stats.current().incumbent(result['LB'], result['UB'], solution=smbpp.get_clients_decision())
         return result
\ No newline at end of file
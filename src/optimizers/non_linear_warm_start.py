@@ -7,23 +7,31 @@ from .greedy_heuristic import GreedyHeuristicOptimizer
 from time import time
 
 class MINLPWarmStartOptimizer(BaseOptimizer):
-    def _solve(self, smbpp, timeout, seed, verbose, **kwargs):
+    def _solve(self, smbpp, timeout, seed, verbose, heuristic=GreedyHeuristicOptimizer,
+               heuristic_share=0.25, **kwargs):
         """
-        .
+        Runs the heuristic (greedy by default, or e.g. CoordinateAscentOptimizer) and uses its
+        solution as the warm start of the exact model.
+        The heuristic gets at most heuristic_share of the timeout and the exact model the time
+        left; the exact model is skipped when there is none.
         """
-        # Create greedy optimizer
+        # Create the warm start optimizer
         if verbose: print('MINLPWarmStartOptimizer')
         start_time = time()
-        greedy_opt = GreedyHeuristicOptimizer()
-        result = greedy_opt.solve(smbpp, timeout, seed, verbose=0, **kwargs)
+        deadline = start_time + timeout
+        heuristic_opt = heuristic()
+        result = heuristic_opt.solve(smbpp, timeout * heuristic_share, seed, verbose=0, **kwargs)
         if verbose:
-            print('\tGreedy runned: %.4fs' % (time() - start_time))
+            print('\t%s runned: %.4fs' % (result['name'], time() - start_time))
             print('\tBest Objective Value: (%.2f, %.2f)' % (result['LB'], result['UB']))
         
         # Create non linear optimizers
         minlp_opt = MINLPOptimizer()
         minlp_opt.set_warm_start(smbpp.get_clients_decision(), smbpp.get_current_prices())
-        result = minlp_opt.solve(smbpp, timeout - result['time'], seed, verbose, **kwargs)
+        if deadline - time() <= 0:
+            result['name'] = self.__class__.__name__
+            return result
+        result = minlp_opt.solve(smbpp, deadline - time(), seed, verbose, **kwargs)
 
         result['name'] = self.__class__.__name__
         return result
\ No newline at end of file
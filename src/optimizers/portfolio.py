@@ -0,0 +1,156 @@
+import queue
+import threading
+import numpy as np
+import multiprocessing as mp
+from time import time
+from .base import BaseOptimizer
+from src import stats
+from .linear import MILPOptimizer
+from .greedy_heuristic import GreedyHeuristicOptimizer
+from .grasp import GRASPOptimizer
+from .genetic_algorithm import GAOptimizer
+from .pricing import PricingOracle
+from src.problem import SMBPP
+from src.solvers import init_worker
+from src.util import gather
+
+# Heuristics raced against the MILP by default: (optimizer, kwargs)
+MEMBERS = (
+    (GreedyHeuristicOptimizer, {}),
+    (GRASPOptimizer, {'iterations': 50, 'alpha': 0.5}),
+    (GAOptimizer, {'num_generations': 50, 'pop_size': 50, 'mut_rate': 0.01}),
+)
+
+def _run_member(k, opt, kwargs, instance, deadline, seed, backend, solutions, shared, results):
+    """
+    Runs one heuristic of PortfolioOptimizer in a worker process, with the time left until
+    the portfolio's deadline. Each new incumbent is sent,
+    with its prices, to the solutions queue; the (LB, UB) in shared stops the heuristic
+    once the portfolio has proven an incumbent optimal.
+    """
+    init_worker(backend, 1)
+    solutions.cancel_join_thread()
+    smbpp = SMBPP.from_csr(*instance)
+    oracle = None
+    stats.reset() # The parent's run, inherited through fork, is not this member's
+
+    def on_improve(lb, ub, x):
+        nonlocal oracle
+        if x is None:
+            return
+        if oracle is None:
+            oracle = PricingOracle(smbpp, cache_mb=0, backend=backend)
+        _, prices = oracle.optimize(x)
+        solutions.put((lb, np.array(x, dtype=np.uint8), np.array(prices)))
+
+    with stats.collect() as run_stats:
+        run_stats.on_improve = on_improve
+        run_stats.shared = lambda: tuple(shared)
+        result = opt().solve(smbpp, max(0.0, deadline - time()), seed, 0, backend=backend,
+                             **kwargs)
+        results.put((k, result['LB'], np.array(smbpp.get_clients_decision()),
+                     np.array(smbpp.get_current_prices()), dict(run_stats.counters)))
+
+
+class PortfolioOptimizer(BaseOptimizer):
+    def _solve(self, smbpp, timeout, seed, verbose, members=MEMBERS, backend='gurobi', **kwargs):
+        """
+        Races the MILP, solved in this process, against heuristics running in worker
+        processes (one core each). The heuristics' incumbents are injected into the running
+        MILP through the solver's MIP callback, and the best (LB, UB) of the portfolio is
+        shared back so that the heuristics stop once an incumbent is proven optimal.
+        Heuristics still running at the deadline (timeout seconds from the start) are
+        terminated; their incumbents were already collected.
+
+        ### Parameters:
+            :members: (optimizer, kwargs) pairs of the heuristics.
+            :backend: LP/MILP solver backend ('gurobi' or 'highs').
+            :kwargs: MILPOptimizer parameters (e.g. dominance).
+        """
+        if verbose: print('PortfolioOptimizer')
+        deadline = time() + timeout
+        instance = (smbpp.n_product, smbpp.n_clients, smbpp.indptr, smbpp.indices,
+                    smbpp.budgets, smbpp.weights)
+        seeds = np.random.SeedSequence(seed).generate_state(len(members)).tolist()
+        ctx = mp.get_context()
+        solutions, results = ctx.Queue(), ctx.Queue()
+        shared = ctx.Array('d', [-np.inf, np.inf], lock=False)
+
+        # The MILP runs with a full Stats, even uninstrumented, to share its bound
+        with stats.collect() as run_stats:
+            previous = run_stats.on_improve # e.g. src.executor's
+            def on_improve(lb, ub, x):
+                shared[0] = -np.inf if lb is None else lb
+                shared[1] = np.inf if ub is None else ub
+                if previous is not None:
+                    previous(lb, ub, x)
+            run_stats.on_improve = on_improve
+
+            # Collects the heuristics' incumbents while the MILP runs
+            lock, done = threading.Lock(), threading.Event()
+            # Best heuristic solution (value, x, prices) and the one not yet injected (x, prices)
+            best = {'value': -np.inf, 'collected': None, 'solution': None}
+            def collect():
+                while not done.is_set():
+                    try:
+                        value, x, prices = solutions.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    with lock:
+                        if value > best['value']:
+                            best['value'], best['solution'] = value, (x, prices)
+                            best['collected'] = (value, x, prices)
+                    run_stats.incumbent(value, solution=x)
+            collector = threading.Thread(target=collect, daemon=True)
+            collector.start()
+
+            def source():
+                with lock:
+                    solution, best['solution'] = best['solution'], None
+                return solution
+
+            processes = []
+            try:
+                for k, (opt, opt_kwargs) in enumerate(members):
+                    processes.append(ctx.Process(target=_run_member, args=(k, opt, opt_kwargs,
+                        instance, deadline, seeds[k], backend, solutions, shared, results)))
+                    processes[-1].start()
+
+                milp = MILPOptimizer()
+                milp.set_solution_source(source)
+                # Its final (LB, UB) also reaches the heuristics, which stop if it is optimal
+                result = milp._solve(smbpp, max(0.0, deadline - time()), seed, verbose,
+                                     backend=backend, **kwargs)
+                if verbose: print('\tMILP finished: (%.2f, %.2f)' % (result['LB'], result['UB']))
+
+                # A member that died does not report, and the others stop at the deadline
+                member_results = sorted(gather(results, processes, max(0.0, deadline - time())),
+                                        key=lambda member: member[0])
+            finally:
+                done.set()
+                collector.join()
+                for process in processes:
+                    process.terminate()
+                    process.join()
+
+        # Merges the members' counters and keeps the best solution: the MILP's, a finished
+        # member's or one collected from a member terminated at the deadline
+        for _, _, _, _, counters in member_results:
+            for name, value in counters.items():
+                stats.current().add(name, value)
+        candidates = list(member_results)
+        if best['collected'] is not None:
+            candidates.append((None, *best['collected'], None))
+        k, best_cost, x, prices, _ = max(candidates, key=lambda member: member[1],
+                                         default=(None, -np.inf, None, None, None))
+        if best_cost > result['LB']:
+            if verbose:
+                print('\tBest solution found by %s' % (members[k][0].__name__ if k is not None
+                                                       else 'a terminated heuristic'))
+            smbpp.set_clients_decision(x.tolist())
+            smbpp.set_prices(prices.tolist())
+            result['LB'] = best_cost
+        stats.current().incumbent(result['LB'], result['UB'])
+
+        result['name'] = self.__class__.__name__
+        return result
@@ -0,0 +1,282 @@
+import numpy as np
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from src import stats
+from src.problem import SMBPP
+from src.solvers import get_model, init_worker
+from time import time
+
+# Pricing oracle of a worker process (see PricingOracle.optimize_many)
+_worker_oracle = None
+
+def _init_worker(instance, backend, threads):
+    global _worker_oracle
+    init_worker(backend, threads)
+    _worker_oracle = PricingOracle(SMBPP.from_csr(*instance), cache_mb=0, backend=backend)
+
+def _worker_optimize(x):
+    return _worker_oracle.optimize(x)
+
+def _worker_optimize_many(xs):
+    return [_worker_oracle.optimize(x) for x in xs]
+
+
+class PricingCache:
+    """
+    LRU cache mapping a buyer set, packed as a bitmask, to its (revenue, prices).
+
+    The cache is bounded by an approximate memory cap (in bytes); the least recently used
+    entries are evicted once the cap is exceeded.
+    """
+
+    def __init__(self, n_product, max_bytes):
+        self.max_bytes = max_bytes
+        # Prices are stored as a float64 array; the constant accounts for the Python objects
+        self.entry_bytes = 8 * n_product + 256
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def key(x):
+        return np.packbits(np.asarray(x) > 0.5).tobytes()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, revenue, prices):
+        if key in self._entries or self.entry_bytes + len(key) > self.max_bytes:
+            return
+        self._entries[key] = (revenue, np.array(prices, dtype=np.float64))
+        self.n_bytes += self.entry_bytes + len(key)
+        while self.n_bytes > self.max_bytes:
+            old_key, _ = self._entries.popitem(last=False)
+            self.n_bytes -= self.entry_bytes + len(old_key)
+
+
+class PricingOracle:
+    """
+    Pricing LP of an instance, built once and updated incrementally.
+
+    Given the clients that must be satisfied (x), the LP computes the best prices:
+        max sum_i c_i * p_i  s.t.  sum_{i in S_j} p_i <= b_j  for every j with x_j = 1
+    where c_i is the number (total weight) of buyers whose bundle contains product i.
+
+    The model keeps one constraint per client. Clients out of the buyer set have their
+    right-hand side relaxed to infinity, so flipping a client only changes its objective
+    coefficients and its constraint, and the solver re-solves from the previous basis.
+
+    Solved buyer sets are memoized in a PricingCache of at most cache_mb megabytes
+    (cache_mb=0 disables it). With n_workers > 1, optimize_many fans the LPs out to a pool
+    of processes, each one holding a private copy of the instance and its own LP.
+    """
+
+    def __init__(self, smbpp, verbose=0, cache_mb=64, n_workers=1, backend='gurobi'):
+        build_start = time()
+        self.smbpp = smbpp
+        self.cache = PricingCache(smbpp.n_product, cache_mb * 2**20) if cache_mb else None
+        self.pool = None
+        if n_workers > 1:
+            instance = (smbpp.n_product, smbpp.n_clients, smbpp.indptr, smbpp.indices,
+                        smbpp.budgets, smbpp.weights)
+            self.pool = ProcessPoolExecutor(n_workers, initializer=_init_worker,
+                                            initargs=(instance, backend, 1))
+            self.n_workers = n_workers
+        self.model = get_model(backend, verbose=verbose)
+
+        # Variables: Prices
+        self.prices = self.model.add_vars(smbpp.n_product)
+
+        # Constraints: one per client, all of them initially inactive
+        self.constrs = self.model.add_constrs(smbpp.bundles, '<', np.full(smbpp.n_clients, np.inf))
+        self.model.set_objective(np.zeros(smbpp.n_product))
+
+        self._x = np.zeros(smbpp.n_clients, dtype=bool)
+        self._coeffs = np.zeros(smbpp.n_product)
+        self._obj_val = 0.0
+        self._values = [0.0] * smbpp.n_product
+        self._dirty = True
+        stats.current().add('build_time', time() - build_start)
+
+    def update(self, x):
+        """
+        Syncs the buyer set of the model with x, touching only the clients that changed.
+        """
+        x = np.asarray(x) > 0.5
+        changed_clients = np.flatnonzero(x != self._x)
+        if len(changed_clients) == 0:
+            return
+        self._x[changed_clients] = x[changed_clients]
+
+        # Objective coefficients gain (lose) the weight of each client added (removed)
+        changed = self.smbpp.bundles[changed_clients]
+        delta = np.where(x[changed_clients], 1.0, -1.0) * self.smbpp.weights[changed_clients]
+        changed_products = np.unique(changed.indices)
+        self._coeffs[changed_products] += (changed.T @ delta)[changed_products]
+
+        self.model.set_rhs(self.constrs[changed_clients],
+            np.where(x[changed_clients], self.smbpp.budgets[changed_clients], np.inf))
+        self.model.set_obj_coeffs(self.prices[changed_products], self._coeffs[changed_products])
+        self._dirty = True
+
+    def _resolve(self, x):
+        self.update(x)
+        if self._dirty:
+            self.model.optimize()
+            self._obj_val = self.model.obj_val()
+            self._values = self.model.get_values(self.prices).tolist()
+            self._dirty = False
+
+    def duals(self, x):
+        """
+        Optimal duals of the client constraints for the clients decision x (0 for the clients
+        out of x). Always solved in this process, bypassing the cache.
+        """
+        self._resolve(x)
+        return self.model.get_duals(self.constrs)
+
+    def optimize(self, x):
+        """
+        Given the clients that must be satisfied, it computes the best prices.
+
+        :return: (revenue, prices)
+        """
+        stats.current().add('evaluations')
+        if self.cache is not None:
+            key = PricingCache.key(x)
+            entry = self.cache.get(key)
+            if entry is not None:
+                return entry[0], entry[1].tolist()
+
+        self._resolve(x)
+        if self.cache is not None:
+            self.cache.put(key, self._obj_val, self._values)
+        return self._obj_val, list(self._values)
+
+    def optimize_many(self, xs, deadline=None):
+        """
+        Computes the best prices for several clients decisions, in the pool when available.
+        The results (and the cache hits/misses) are the same as calling optimize on each x.
+        Once time() exceeds the deadline it stops (with a pool, it stops submitting LPs and
+        waits for the ones in flight) and returns the results of the decisions evaluated so
+        far (a prefix of xs).
+
+        :return: list of (revenue, prices)
+        """
+        if self.pool is None:
+            results = []
+            for x in xs:
+                if deadline is not None and time() > deadline: break
+                results.append(self.optimize(x))
+            return results
+
+        run_stats = stats.current()
+        results, pending = [None] * len(xs), {}
+        for k, x in enumerate(xs):
+            key = PricingCache.key(x)
+            entry = self.cache.get(key) if self.cache is not None else None
+            if entry is not None:
+                results[k] = (entry[0], entry[1].tolist())
+            elif key in pending:
+                if self.cache is not None:
+                    # Repeated in this batch: served from the cache when solved sequentially
+                    self.cache.hits += 1
+                    self.cache.misses -= 1
+                pending[key].append(k)
+            else:
+                pending[key] = [k]
+
+        keys = list(pending)
+        chunksize = max(1, len(keys) // (4 * self.n_workers))
+        chunks = iter([keys[i:i + chunksize] for i in range(0, len(keys), chunksize)])
+        # Chunks in flight, drained in order; no new ones once the deadline has passed
+        window = deque()
+        while True:
+            while len(window) < 2 * self.n_workers and (deadline is None or time() <= deadline):
+                chunk = next(chunks, None)
+                if chunk is None: break
+                window.append((chunk, self.pool.submit(_worker_optimize_many,
+                                                       [xs[pending[key][0]] for key in chunk])))
+            if not window:
+                break
+            chunk, future = window.popleft()
+            # The LPs solved by the workers are not seen by the solver instrumentation
+            run_stats.add('lp_solves', len(chunk))
+            for key, (revenue, prices) in zip(chunk, future.result()):
+                if self.cache is not None:
+                    self.cache.put(key, revenue, prices)
+                for k in pending[key]:
+                    results[k] = (revenue, list(prices))
+
+        evaluated = next((k for k, result in enumerate(results) if result is None), len(results))
+        run_stats.add('evaluations', evaluated)
+        return results[:evaluated]
+
+    def first_improving(self, xs, threshold, deadline=None):
+        """
+        First-improving scan over the clients decisions xs (any iterable, consumed lazily).
+        Stops submitting new LPs once time() exceeds the deadline.
+
+        With a pool, a window of LPs is kept in flight and, as soon as the first improving
+        decision is known, the outstanding ones are cancelled. The answer is the same as the
+        serial scan: the lowest k whose revenue exceeds the threshold.
+
+        :return: (k, revenue) or None when no decision improves.
+        """
+        if self.pool is None:
+            for k, x in enumerate(xs):
+                revenue, _ = self.optimize(x)
+                if revenue > threshold:
+                    return k, revenue
+                if deadline is not None and time() > deadline: break
+            return None
+
+        xs, window, run_stats = enumerate(xs), deque(), stats.current()
+        try:
+            while True:
+                while len(window) < 4 * self.n_workers and (deadline is None or time() <= deadline):
+                    item = next(xs, None)
+                    if item is None: break
+                    k, x = item
+                    key = PricingCache.key(x)
+                    entry = self.cache.get(key) if self.cache is not None else None
+                    if entry is not None:
+                        window.append((k, key, None, entry[0]))
+                    else:
+                        window.append((k, key, self.pool.submit(_worker_optimize, x), None))
+                if not window:
+                    return None
+
+                k, key, future, revenue = window.popleft()
+                run_stats.add('evaluations')
+                if future is not None:
+                    revenue, prices = future.result()
+                    run_stats.add('lp_solves')
+                    if self.cache is not None:
+                        self.cache.put(key, revenue, prices)
+                if revenue > threshold:
+                    return k, revenue
+        finally:
+            for _, _, future, _ in window:
+                if future is not None:
+                    future.cancel()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def cache_info(self):
+        """
+        Returns the number of cache hits and misses (LP solves saved and performed).
+        """
+        if self.cache is None:
+            return {'cache_hits': 0, 'cache_misses': 0}
+        return {'cache_hits': self.cache.hits, 'cache_misses': self.cache.misses}
@@ -1,2 +1,3 @@
 from .result import Result
-from .smbpp import SMBPP
\ No newline at end of file
+from .smbpp import SMBPP, Solution
+from .reduction import Reduction
\ No newline at end of file
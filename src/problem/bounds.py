@@ -0,0 +1,56 @@
+"""
+Bounds and valid inequalities of the problem: the MILP uses the dominance inequalities,
+the price and bundle bounds serve the LP upper bound and the GRASP move screening.
+
+All of them keep at least one optimal solution, using two facts: a product that no buyer
+wants can be priced at 0, and a client whose bundle is cheaper than its budget can always
+be turned into a buyer without losing revenue.
+"""
+
+import numpy as np
+
+def price_bounds(smbpp):
+    """
+    Upper bound on each product price: the largest budget of a client that contains it
+    (0 for products in no bundle).
+    """
+    u = np.zeros(smbpp.n_product)
+    np.maximum.at(u, smbpp.indices, np.repeat(smbpp.budgets.astype(np.float64),
+        np.diff(smbpp.indptr)))
+    return u
+
+def bundle_bounds(smbpp, u=None):
+    """
+    Big-M of each client: an upper bound on the cost of its bundle. The cost is at most
+    sum_{i in S_j} u_i and, as each priced product of S_j is bought by some client k whose
+    bundle meets S_j (and the products of S_j in S_k cost at most b_k), also at most the
+    budget sum of the clients whose bundles meet S_j.
+    """
+    u = price_bounds(smbpp) if u is None else u
+    S = smbpp.bundles
+    overlapping = (S @ S.T) > 0
+    return np.minimum(S @ u, overlapping @ smbpp.budgets.astype(np.float64))
+
+def dominance_pairs(smbpp):
+    """
+    Pairs (j, k) with S_j a subset of S_k and b_j >= b_k: whenever k buys, j can afford its
+    bundle, so x_j >= x_k holds for some optimal solution.
+
+    :return: (j, k) arrays of client indices.
+    """
+    S = smbpp.bundles
+    overlap = (S @ S.T).tocoo()
+    sizes = np.diff(smbpp.indptr)
+    j, k = overlap.row, overlap.col
+    keep = (j != k) & (overlap.data == sizes[j]) & (smbpp.budgets[j] >= smbpp.budgets[k])
+    return j[keep], k[keep]
+
+def close_decisions(x, pairs):
+    """
+    Turns into buyers the clients dominated by a buyer, so that x satisfies the dominance
+    inequalities. One pass is enough since dominance is transitive.
+    """
+    x = np.rint(np.asarray(x, dtype=np.float64))
+    j, k = pairs
+    np.maximum.at(x, j, x[k])
+    return x
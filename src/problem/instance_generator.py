@@ -4,9 +4,10 @@ import math
 import json
 import random
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from glob import glob
 from itertools import product
-from src.util import read_json, save_json
+from src.util import read_json
 
 def decision(probability):
     return random.random() < probability
@@ -50,7 +51,64 @@ def generate_instance_paper(n, m, d):
         clients[j]['S'].append(int(i))
     return [n, m, clients]
 
-def generate_and_save_all(save_folder='instances'):
+def sample_chunks(n, m, d, seeds):
+    """
+    Samples the clients of generate_instance_paper in blocks, one block per seed (a
+    np.random.SeedSequence), so any block can be drawn again identically.
+
+    :return: generator of (first client, budgets, bundle mask of shape (rows, n)).
+    """
+    chunk_size = math.ceil(m / len(seeds))
+    for k, seed in enumerate(seeds):
+        rng = np.random.default_rng(seed)
+        beg = k * chunk_size
+        rows = min(chunk_size, m - beg)
+        yield beg, rng.integers(1, 1000, rows), rng.random((rows, n)) < d
+
+def repair_bundles(n, m, d, seeds, rng):
+    """
+    First pass of generate_instance_stream: applies the repair rules of
+    generate_instance_paper while keeping only the product usage and the empty bundles.
+
+    :return: {client: products appended to its bundle}
+    """
+    used, empty = np.zeros(n, dtype=bool), []
+    for beg, _, mask in sample_chunks(n, m, d, seeds):
+        used |= mask.any(axis=0)
+        empty += (beg + np.flatnonzero(~mask.any(axis=1))).tolist()
+
+    unused, extra = np.flatnonzero(~used).tolist(), {}
+    for j in empty:
+        i = unused.pop() if len(unused) > 0 else int(rng.integers(0, n))
+        extra.setdefault(j, []).append(i)
+    for i in unused:
+        extra.setdefault(int(rng.integers(0, m)), []).append(i)
+    return extra
+
+def generate_instance_stream(n, m, d, filename, seed=None, max_cells=2**22):
+    """
+    Same distribution as generate_instance_paper, for instances that do not fit in memory.
+    The bundle matrix is sampled in blocks of at most max_cells cells with a seeded NumPy
+    Generator, twice: the first pass finds the repairs and the second one writes the
+    clients to the JSON file as they are drawn. The same seed and max_cells give the same
+    instance.
+    """
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    seeds = root.spawn(math.ceil(m / max(1, max_cells // n)))
+    extra = repair_bundles(n, m, d, seeds, np.random.default_rng(root.spawn(1)[0]))
+
+    with open(filename, 'w') as f:
+        f.write(f'{{"n": {n}, "m": {m}, "clients": [')
+        for beg, budgets, mask in sample_chunks(n, m, d, seeds):
+            rows, cols = np.nonzero(mask)
+            bundles = np.split(cols, np.searchsorted(rows, np.arange(1, len(budgets))))
+            f.write((', ' if beg else '') + ', '.join(
+                f'{{"b": {b}, "S": [{", ".join(map(str, S.tolist() + extra.get(beg + j, [])))}]}}'
+                for j, (b, S) in enumerate(zip(budgets.tolist(), bundles))
+            ))
+        f.write(']}')
+
+def generate_and_save_all(save_folder='instances', seed=None, n_workers=1):
     os.makedirs(save_folder, exist_ok=True)
 
     # Small set
@@ -65,11 +123,12 @@ def generate_and_save_all(save_folder='instances'):
     d = {0.5}           # Density of matrix S
     combinations = combinations + list(product(['big'], N, M, d))
 
-    for size, n, m, d in combinations:
-        for idx in range(10):  # Generatin 10 instaces for each config
-            ins = generate_instance_paper(n, m, d)
-            json_ins = instance2json(ins)
-            save_json(os.path.join(save_folder, f'{size}-N{n}M{m}d{d}-{idx}.json'), json_ins)
+    jobs = [(n, m, d, os.path.join(save_folder, f'{size}-N{n}M{m}d{d}-{idx}.json'))
+            for size, n, m, d in sorted(combinations)
+            for idx in range(10)]  # Generatin 10 instaces for each config
+    seeds = np.random.SeedSequence(seed).spawn(len(jobs))
+    with ProcessPoolExecutor(n_workers) as executor:
+        list(executor.map(generate_instance_stream, *zip(*jobs), seeds))
 
 def instance2json(ins):
     names = ['n', 'm', 'clients']
@@ -0,0 +1,118 @@
+"""
+Binary instance store: all the instances of a campaign in a few .npy files.
+
+    indptr.npy   (int64)  CSR row pointers of every client, over the global indices array
+    indices.npy  (int32)  Bundles of every client, one after another
+    budgets.npy  (int64)  Budget of every client
+    meta.npy              One row per instance: name, size, N, M, d, idx and the offset of
+                          its first client
+
+The store is opened as a memory map, so every process shares the same pages and an
+instance is a set of views on these arrays.
+"""
+
+import os
+import sys
+import numpy as np
+from fnmatch import fnmatch
+from . import instance_generator as ins
+from .smbpp import SMBPP
+
+META_DTYPE = np.dtype([('name', 'U64'), ('size', 'U8'), ('N', np.int64), ('M', np.int64),
+    ('d', np.float64), ('idx', np.int64), ('offset', np.int64)])
+
+# Stores already opened by this process (see open_store)
+_stores = {}
+
+def save(path, names, instances):
+    """
+    Writes the instances ([n, m, clients] lists) in the store at path.
+    """
+    os.makedirs(path, exist_ok=True)
+    meta = np.zeros(len(names), dtype=META_DTYPE)
+    indptrs, indices, budgets, offset, n_indices = [np.zeros(1, dtype=np.int64)], [], [], 0, 0
+    for k, (name, instance) in enumerate(zip(names, instances)):
+        n, m, clients = instance
+        indptr, ind, b = SMBPP.to_csr(clients)
+        vins = ins.get_info_from_name(name)
+        meta[k] = (name, name.split('-')[0], n, m, vins['d'], vins['idx'], offset)
+        indptrs.append(indptr[1:] + n_indices)
+        indices.append(ind)
+        budgets.append(b.astype(np.int64))
+        offset, n_indices = offset + m, n_indices + len(ind)
+
+    np.save(os.path.join(path, 'indptr.npy'), np.concatenate(indptrs))
+    np.save(os.path.join(path, 'indices.npy'), np.concatenate(indices).astype(np.int32))
+    np.save(os.path.join(path, 'budgets.npy'), np.concatenate(budgets))
+    np.save(os.path.join(path, 'meta.npy'), meta)
+
+def convert(folder='instances', path='instances.store'):
+    """
+    Converts a folder of JSON instances into a store, in the order of list_avaliable_instances.
+    """
+    names = ins.list_avaliable_instances(os.path.join(folder, '*.json'))
+    save(path, names, (ins.load(os.path.join(folder, name)) for name in names))
+    return path
+
+def open_store(path='instances.store'):
+    """
+    Opens the store at path, once per process.
+    """
+    if path not in _stores:
+        _stores[path] = InstanceStore(path)
+    return _stores[path]
+
+
+class InstanceStore:
+    """
+    Read-only view of a store written by save.
+    """
+
+    def __init__(self, path='instances.store'):
+        self.path = path
+        self.indptr = np.load(os.path.join(path, 'indptr.npy'), mmap_mode='r')
+        self.indices = np.load(os.path.join(path, 'indices.npy'), mmap_mode='r')
+        self.budgets = np.load(os.path.join(path, 'budgets.npy'), mmap_mode='r')
+        self.meta = np.load(os.path.join(path, 'meta.npy'))
+        self._rows = {name: k for k, name in enumerate(self.meta['name'].tolist())}
+
+    def names(self, pattern='*'):
+        """
+        Names of the instances matching the (shell-style) pattern, in the store order.
+        """
+        return [name for name in self.meta['name'].tolist() if fnmatch(name, pattern)]
+
+    def info(self, name):
+        """
+        Same as instance_generator.get_info_from_name, plus the size class.
+        """
+        row = self.meta[self._rows[name]]
+        return {'N': int(row['N']), 'M': int(row['M']), 'd': float(row['d']),
+            'idx': int(row['idx']), 'size': str(row['size'])}
+
+    def csr(self, name):
+        """
+        CSR arrays of an instance (see SMBPP.from_csr). indices and budgets are views of
+        the memory map; only the row pointers are rebased.
+        """
+        row = self.meta[self._rows[name]]
+        beg, end = int(row['offset']), int(row['offset'] + row['M'])
+        indptr = np.array(self.indptr[beg:end + 1])
+        indices = np.asarray(self.indices[indptr[0]:indptr[-1]])
+        return (int(row['N']), int(row['M']), indptr - indptr[0], indices,
+            np.asarray(self.budgets[beg:end]))
+
+    def smbpp(self, name):
+        return SMBPP.from_csr(*self.csr(name))
+
+    def load(self, name):
+        """
+        Instance as an [n, m, clients] list, like instance_generator.load.
+        """
+        smbpp = self.smbpp(name)
+        return [smbpp.n_product, smbpp.n_clients, smbpp.clients]
+
+
+if __name__ == "__main__":
+    # python -m src.problem.instance_store [instances folder] [store path]
+    print('Store saved at', convert(*sys.argv[1:3]))
@@ -1,55 +1,184 @@
 import numpy as np
+from itertools import chain
+from scipy.sparse import csr_matrix
 from gurobipy import quicksum
 
+class Solution:
+    """
+    Clients decisions (x) and product prices (p) of one solution. It holds no instance data,
+    so many solutions can share one SMBPP instance.
+    """
+
+    __slots__ = ('x', 'p')
+
+    def __init__(self, x, p):
+        self.x = x
+        self.p = p
+
+
 class SMBPP:
+    """
+    Problem instance, immutable once built: its arrays are read-only and the derived data
+    (price bounds, budget order) is computed once. The current solution lives in a separate
+    Solution object.
+    """
+
     def __init__(self, instance):
-        self.n_product, self.n_clients, self.clients = instance
-        self._x = None # Clients decisions
-        self._p = None # Product prices
+        self.n_product, self.n_clients, clients = instance
+        self.indptr = None # Bundle matrix S (clients x products) in CSR form
+        self.indices = None
+        self.budgets = None # Clients budgets
+        self.weights = None # Number of identical clients each client stands for
+        self.bundles = None # S as a scipy sparse matrix
+        self._clients = None # List-of-dicts view of the clients, built on demand
         self._u = None # Upper bound on prices
+        self._order = None # Clients by decreasing budget, built on demand
+        self._set_bundles(*SMBPP.to_csr(clients))
+        self.solution = None # Current solution
         self.reset_current_solution()
 
-    def reset_current_solution(self):
-        self._x = [0] * self.n_clients
-        self._p = [0.0] * self.n_product
-        self._u = [0.0] * self.n_product
+    @classmethod
+    def from_csr(cls, n_product, n_clients, indptr, indices, budgets, weights=None):
+        """
+        Creates an instance straight from its CSR arrays (see SMBPP.to_csr).
+        """
+        smbpp = cls([n_product, 0, []])
+        smbpp.n_clients = n_clients
+        smbpp._set_bundles(indptr, indices, budgets, weights)
+        smbpp.reset_current_solution()
+        return smbpp
+
+    def _set_bundles(self, indptr, indices, budgets, weights=None):
+        weights = np.ones(self.n_clients) if weights is None else weights
+        # Read-only views: the instance is shared by every solution (and thread)
+        self.indptr, self.indices, self.budgets, self.weights = [
+            array.view() for array in (indptr, indices, budgets, weights)]
+        for array in (self.indptr, self.indices, self.budgets, self.weights):
+            array.flags.writeable = False
+        self.bundles = csr_matrix(
+            (np.ones(len(indices)), indices, indptr), shape=(self.n_clients, self.n_product)
+        )
+        self._clients = None
+        self._order = None
+        self._u = np.zeros(self.n_product)
+        np.maximum.at(self._u, self.indices, np.repeat(self.budgets, np.diff(self.indptr)))
+        self._u.flags.writeable = False
+
+    def new_solution(self):
+        """
+        Empty solution: no buyer and every price at 0.
+        """
+        return Solution([0] * self.n_clients, [0.0] * self.n_product)
+
+    @property
+    def clients(self):
+        """
+        Clients as a list of {'b': budget, 'S': bundle} dicts, kept for compatibility.
+        """
+        if self._clients is None:
+            self._clients = [
+                {'b': b, 'S': self.indices[beg:end].tolist()}
+                for b, beg, end in zip(self.budgets.tolist(), self.indptr[:-1].tolist(),
+                    self.indptr[1:].tolist())
+            ]
+        return self._clients
+
+    def bundle(self, client_idx):
+        return self.indices[self.indptr[client_idx]:self.indptr[client_idx + 1]]
 
-        for client in self.clients:
-            for i in client['S']:
-                self._u[i] = max(self._u[i], client['b'])
+    def reset_current_solution(self):
+        self.solution = self.new_solution()
 
     def set_prices(self, p):
-        self._p = p
+        self.solution.p = p
     
     def get_current_prices(self):
-        return self._p
+        return self.solution.p
 
     def set_client_decision(self, client_idx, buy):
-       self._x[client_idx] = int(buy)
+       self.solution.x[client_idx] = int(buy)
 
     def set_clients_decision(self, x):
-        self._x = x
+        self.solution.x = x
 
     def get_clients_decision(self):
-        return self._x
+        return self.solution.x
 
     def get_objective_function(self):
         return SMBPP.objective_function
 
-    def sort_clients_by_budget(self):
-        self.clients = sorted(self.clients, key=lambda k: k['b'], reverse=True)
+    def clients_by_budget(self):
+        """
+        Client indices by decreasing budget (stable), without reordering the instance.
+        """
+        if self._order is None:
+            self._order = np.argsort(-self.budgets, kind='stable')
+            self._order.flags.writeable = False
+        return self._order
 
     def current_cost(self):
-        return SMBPP.objective_function(self._p, self._x, self.clients)
+        return self.revenue(self.solution.p, self.solution.x)
 
     def validate_current_solution(self):
-        return SMBPP.validate(self._p, self._x, self.clients)
+        return self.is_feasible(self.solution.p, self.solution.x)
+
+    def bundle_costs(self, p):
+        """
+        Cost of the bundle of every client under prices p (one sparse mat-vec).
+        """
+        return self.bundles @ np.asarray(p, dtype=np.float64)
+
+    def revenue(self, p, x):
+        """
+        Vectorized version of SMBPP.objective_function for numeric p and x.
+        """
+        return float(self.bundle_costs(p) @ (self.weights * np.asarray(x, dtype=np.float64)))
+
+    def is_feasible(self, p, x):
+        """
+        Vectorized version of SMBPP.validate for numeric p and x.
+        """
+        excess = (self.bundle_costs(p) - self.budgets) * np.rint(np.asarray(x, dtype=np.float64))
+        return not np.any((excess > 0) & ~np.isclose(excess, 0))
+
+    def evaluate(self, P, X):
+        """
+        Evaluates a batch of solutions at once.
+
+        ### Parameters:
+            :P: (k, n_product) matrix, one price vector per row.
+            :X: (k, n_clients) matrix, one clients decision vector per row.
+
+        :return: (revenues, feasible) vectors of length k.
+        """
+        P = np.atleast_2d(np.asarray(P, dtype=np.float64))
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        costs = (self.bundles @ P.T).T
+        revenues = np.einsum('ij,ij->i', costs, X * self.weights)
+        excess = (costs - self.budgets) * np.rint(X)
+        feasible = ~np.any((excess > 0) & ~np.isclose(excess, 0), axis=1)
+        return revenues, feasible
 
     def get_maximum_revenue(self):
-        return sum(client['b'] for client in self.clients)
+        return (self.budgets @ self.weights).item()
 
     def get_bundle_bound(self, client_idx):
-        return sum(self._u[i] for i in self.clients[client_idx]['S'])
+        return self._u[self.bundle(client_idx)].sum().item()
+
+    def get_bundle_bounds(self):
+        return self.bundles @ self._u
+
+    @staticmethod
+    def to_csr(clients):
+        """
+        Converts a list of {'b', 'S'} clients into (indptr, indices, budgets) arrays.
+        """
+        indptr = np.zeros(len(clients) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(client['S']) for client in clients])
+        indices = np.fromiter(chain.from_iterable(client['S'] for client in clients),
+            dtype=np.int32, count=indptr[-1])
+        budgets = np.array([client['b'] for client in clients])
+        return indptr, indices, budgets
 
     @staticmethod
     def objective_function(p, x, clients):
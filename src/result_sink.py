@@ -0,0 +1,99 @@
+"""
+Append-only store of the runner results, written as each job finishes.
+
+Every job is keyed by a content hash of its instance, optimizer name, kwargs and seed, so a
+restarted campaign skips the jobs that already finished. Jobs that failed are kept apart,
+with their error, and run again on restart.
+"""
+
+import os
+import json
+import sqlite3
+import hashlib
+import numpy as np
+
+def instance_hash(smbpp):
+    """
+    Content hash of an instance (sizes, bundles and budgets), independent of its file.
+    """
+    h = hashlib.sha256()
+    h.update(np.array([smbpp.n_product, smbpp.n_clients], dtype=np.int64).tobytes())
+    h.update(np.ascontiguousarray(smbpp.indptr, dtype=np.int64).tobytes())
+    h.update(np.ascontiguousarray(smbpp.indices, dtype=np.int64).tobytes())
+    h.update(np.ascontiguousarray(smbpp.budgets, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+def job_key(instance_key, optimizer_name, kwargs, seed):
+    """
+    Key of a job: hash of the instance hash, the optimizer name, its kwargs and the seed.
+    """
+    content = json.dumps([instance_key, optimizer_name, kwargs, seed], sort_keys=True, default=str)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class ResultSink:
+    """
+    SQLite table of result rows, and one of the errors of the failed jobs. Each row is
+    committed as soon as it is written, so a crash loses at most the jobs still running.
+    """
+
+    def __init__(self, filename='results/results.db'):
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(filename)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, instance TEXT, optimizer TEXT, kwargs TEXT, seed INTEGER, "
+            "row TEXT, created TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS failures ("
+            "key TEXT PRIMARY KEY, instance TEXT, optimizer TEXT, kwargs TEXT, seed INTEGER, "
+            "error TEXT, created TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+        )
+        self.conn.commit()
+
+    def finished(self):
+        """
+        Keys of the jobs already in the sink (not the failed ones).
+        """
+        return {key for key, in self.conn.execute("SELECT key FROM results")}
+
+    def write(self, key, instance, optimizer, kwargs, seed, row):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO results (key, instance, optimizer, kwargs, seed, row) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, instance, optimizer, json.dumps(kwargs, sort_keys=True, default=str), seed,
+             json.dumps(row, default=lambda v: v.item()))
+        )
+        self.conn.execute("DELETE FROM failures WHERE key = ?", (key,))
+        self.conn.commit()
+
+    def write_failure(self, key, instance, optimizer, kwargs, seed, error):
+        """
+        Records the error of a failed job (its traceback or exit code), replacing the previous
+        one. The job is not finished and runs again on restart.
+        """
+        self.conn.execute(
+            "INSERT OR REPLACE INTO failures (key, instance, optimizer, kwargs, seed, error) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, instance, optimizer, json.dumps(kwargs, sort_keys=True, default=str), seed,
+             error)
+        )
+        self.conn.commit()
+
+    def failures(self):
+        """
+        (instance, optimizer, error) of the failed jobs, in insertion order.
+        """
+        return self.conn.execute(
+            "SELECT instance, optimizer, error FROM failures ORDER BY rowid").fetchall()
+
+    def rows(self, keys=None):
+        """
+        Result rows, in insertion order, of the given jobs (all of them by default).
+        """
+        rows = self.conn.execute("SELECT key, row FROM results ORDER BY rowid")
+        return [json.loads(row) for key, row in rows if keys is None or key in keys]
+
+    def close(self):
+        self.conn.close()
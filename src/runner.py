@@ -1,15 +1,26 @@
+import os
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime as dt
 from tqdm import tqdm
 from src.problem import instance_generator as ins
+from src.problem import Reduction, Result
+from src.problem.instance_store import open_store
 from src.problem.smbpp import SMBPP
+from src.metrics import add_summaries
+from src.result_sink import ResultSink, instance_hash, job_key
+from src.solvers import init_worker
+from src.executor import run_with_deadline
+from src.optimizers.pricing import PricingOracle
 from src.optimizers import (MILPOptimizer,
                     MILPWarmStartOptimizer,
                     GRASPOptimizer,
                     MINLPOptimizer,
                     GreedyHeuristicOptimizer,
                     MINLPWarmStartOptimizer,
-                    GAOptimizer)
+                    GAOptimizer,
+                    CoordinateAscentOptimizer,
+                    PortfolioOptimizer)
 
 
 def main():
@@ -19,10 +30,38 @@ def main():
     VERBOSE = 1
     # Random seed
     SEED = 42
-    
-    df_results = pd.DataFrame(columns=["optimizer_name", "N", "M", "d", "idx", 
-                                    "time", "LB", "UB", "is_valid"])
-    instances = ins.list_avaliable_instances("instances/small*.json")[:5]
+    # LP/MILP solver backend ('gurobi' or 'highs')
+    BACKEND = 'gurobi'
+    # Number of worker processes (1 - Run serially in this process)
+    N_WORKERS = 1
+    # Solver threads per worker (0 - Let Gurobi decide)
+    THREADS_PER_WORKER = 1
+    # Merge equivalent products and identical clients before optimizing (see
+    # src.problem.reduction: it shrinks instances with random budgets very little)
+    REDUCE = False
+    # Report solver counters and timers (src.stats) in the results
+    INSTRUMENT = True
+    # Seconds past TIMEOUT after which a job is killed, keeping its last incumbent
+    GRACE = 10
+    # Heuristics stop once within this relative gap of their upper bound (None - Never). Their
+    # bounds (src.optimizers.bounding) are too weak for a gap of a few % to be reached
+    TARGET_GAP = None
+    # Binary instance store (python -m src.problem.instance_store); JSON files when missing
+    INSTANCE_STORE = 'instances.store'
+    # Results of every job, written as it finishes; finished jobs are skipped on restart and
+    # failed ones (kept with their error) run again
+    RESULTS_DB = 'results/results.db'
+
+    columns = ["optimizer_name", "N", "M", "d", "idx", "time", "LB", "UB", "is_valid",
+               "N_reduced", "M_reduced", "build_time", "bound_time", "solve_time", "validate_time",
+               "lp_solves", "milp_solves", "simplex_iterations", "evals_per_sec", "cache_hits",
+               "screened_moves", "timed_out", "time_to_best", "ttt_1", "ttt_5", "primal_integral"]
+    if not os.path.isdir(INSTANCE_STORE):
+        INSTANCE_STORE = None
+    if INSTANCE_STORE:
+        instances = open_store(INSTANCE_STORE).names("small*")[:5]
+    else:
+        instances = ins.list_avaliable_instances("instances/small*.json")[:5]
     print('Total of instances:', len(instances))
     """
 
@@ -35,7 +74,9 @@ def main():
                 'pop_size': 50,
                 'mut_rate': 0.01,
                 'selection_method': 1,
-                'uniform_cross': True
+                'uniform_cross': True,
+                'n_islands': 1,
+                'target_gap': TARGET_GAP
             }
         },
         {
@@ -51,6 +92,7 @@ def main():
             'kwargs': {
                 'iterations': 50,
                 'alpha': 0.5,
+                'target_gap': TARGET_GAP
             }
         },
         {
@@ -63,41 +105,192 @@ def main():
         },
         {
             'opt': GreedyHeuristicOptimizer,
+            'kwargs': {
+                'target_gap': TARGET_GAP
+            }
+        },
+        {
+            'opt': CoordinateAscentOptimizer,
+            'kwargs': {
+                'passes': 100,
+                'restarts': 10,
+            }
+        },
+        {
+            'opt': PortfolioOptimizer,
             'kwargs': {}
         }
     ]
 
-    for name in tqdm(instances):
-        if VERBOSE: print(f'Running instance: {name}')
-        # Load instance
-        instance = ins.load(f'instances/{name}')
+    # Skip the jobs already in the sink
+    sink = ResultSink(RESULTS_DB)
+    finished, keys, jobs = sink.finished(), [], []
+    for name in instances:
+        instance_key = instance_hash(load_instance(name, INSTANCE_STORE))
         for opt in opts:
-            # Create optimizer and model instance
-            optimizer = opt['opt']()
-            smbpp = SMBPP(instance)
-
-            # Run optimization
-            result = optimizer.solve(smbpp, TIMEOUT, SEED, VERBOSE, **opt['kwargs'])
-            if VERBOSE : print("\tResultados:\n",result, '\n')
-
-            vins = ins.get_info_from_name(name)
-            df_results = df_results.append(
-                {
-                    "optimizer_name": result['name'],
-                    "N": instance[0],
-                    "M": instance[1],
-                    "d": vins['d'],
-                    "idx": vins['idx'],
-                    "time": round(result['time'], 4),
-                    "LB": round(result['LB'], 2),
-                    "UB": round(result['UB'], 2),
-                    "is_valid": result['is_valid']
-                },
-                ignore_index=True,
-            )
+            settings = dict(opt['kwargs'], timeout=TIMEOUT, backend=BACKEND, reduce=REDUCE)
+            key = job_key(instance_key, opt['opt'].__name__, settings, SEED)
+            keys.append(key)
+            if key not in finished:
+                jobs.append((key, (name, opt['opt'].__name__, settings, SEED),
+                             (name, opt, TIMEOUT, SEED, VERBOSE, BACKEND, REDUCE, INSTANCE_STORE,
+                              INSTRUMENT)))
+    print('Finished jobs:', len(keys) - len(jobs), 'Remaining:', len(jobs))
+
+    def record(key, info, outcome):
+        row, error = outcome
+        if error is None:
+            sink.write(key, *info, row)
+        else:
+            sink.write_failure(key, *info, error)
+            if VERBOSE: tqdm.write(f'Failed: {info[1]} on {info[0]}\n{error}')
+
+    # Every job runs in its own process, killed TIMEOUT + GRACE seconds after it started
+    if N_WORKERS == 1:
+        for key, info, job in tqdm(jobs):
+            record(key, info, execute(job, TIMEOUT + GRACE))
+    else:
+        with ThreadPoolExecutor(N_WORKERS) as executor:
+            futures = {executor.submit(execute, job, TIMEOUT + GRACE, THREADS_PER_WORKER): (key, info)
+                       for key, info, job in jobs}
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                record(*futures[future], future.result())
+    print('Failed jobs:', len(sink.failures()))
+
+    # Anytime summaries (the traces themselves stay in the sink)
+    rows = add_summaries(sink.rows(set(keys)), TIMEOUT)
+    df_results = pd.DataFrame(rows, columns=columns)
+    sink.close()
     file_id = dt.now().isoformat().replace(':', '-').replace('.', '-')
     df_results.to_csv(f"results/{file_id}.csv", index=False)
 
 
+def load_instance(name, store=None):
+    """
+    Loads an instance from the binary store, or from its JSON file when store is None.
+    """
+    if store:
+        return open_store(store).smbpp(name)
+    return SMBPP(ins.load(f'instances/{name}'))
+
+
+def execute(job, hard_timeout, threads=0):
+    """
+    Runs a job (the arguments of run_job) in a new process with `threads` solver threads,
+    killing it after hard_timeout seconds.
+
+    :return: (row, error): its row of the results table, or None and the error (traceback or
+        exit code) of a job that failed.
+    """
+    status, value, incumbents = run_with_deadline(run_job, job, hard_timeout, init_worker,
+        (job[5], threads), instrument=job[8])
+    if status == 'failed':
+        return None, value
+    if status == 'timeout':
+        return timeout_row(job, incumbents, hard_timeout, threads), None
+    if not value['trace']: # Uninstrumented: the incumbents reported to the executor
+        value['trace'] = [(round(t, 4), lb, ub) for t, lb, ub in incumbents.trace]
+    return value, None
+
+
+def run_job(name, opt, timeout, seed, verbose, backend='gurobi', reduce=False, store=None,
+            instrument=True):
+    """
+    Runs one optimizer on one instance and returns its row of the results table.
+    """
+    if verbose: print(f'Running instance: {name}')
+    # Load instance
+    smbpp = load_instance(name, store)
+    # Create optimizer
+    optimizer = opt['opt']()
+    reduction = Reduction(smbpp) if reduce else None
+
+    # Run optimization
+    result = optimizer.solve(reduction.smbpp if reduce else smbpp, timeout, seed, verbose,
+        backend=backend, instrument=instrument, **opt['kwargs'])
+    if reduction is not None:
+        # Map the solution back and validate it on the original instance
+        reduction.restore()
+        result['LB'] = smbpp.current_cost()
+        result['is_valid'] = smbpp.validate_current_solution()
+        result.update(reduction.stats())
+        result['time'] += result['reduction_time']
+    if verbose : print("\tResultados:\n",result, '\n')
+    return make_row(name, smbpp, result)
+
+
+def timeout_row(job, incumbents, hard_timeout, threads=0):
+    """
+    Row of a job killed at its deadline (see execute), built from the last incumbent it
+    reported: its clients decision is priced and validated on the original instance, in a
+    new process as well (solver environments are not thread-safe).
+    """
+    name, opt, _, _, _, backend, reduce, store, _ = job
+    smbpp = load_instance(name, store)
+    result = Result(name=opt['opt'].__name__, time=incumbents.elapsed, LB=incumbents.lb,
+                    UB=incumbents.ub, is_valid=False, trace=incumbents.trace, timed_out=True)
+    if reduce:
+        result.update(Reduction(smbpp).stats())
+    if incumbents.x is not None:
+        status, value, _ = run_with_deadline(price_incumbent, (job, incumbents.x),
+            hard_timeout, init_worker, (backend, threads), instrument=False)
+        if status == 'finished':
+            result['LB'], result['is_valid'] = value
+    return make_row(name, smbpp, result)
+
+
+def price_incumbent(job, x):
+    """
+    Revenue and validity, on the original instance, of the clients decision x (of the solved
+    instance, reduced or not) at its optimal prices.
+    """
+    name, _, _, _, _, backend, reduce, store, _ = job
+    smbpp = load_instance(name, store)
+    reduction = Reduction(smbpp) if reduce else None
+    solved = reduction.smbpp if reduce else smbpp
+    _, prices = PricingOracle(solved, cache_mb=0, backend=backend).optimize(x)
+    solved.set_clients_decision(x.tolist())
+    solved.set_prices(prices)
+    if reduction is not None:
+        reduction.restore()
+    return smbpp.current_cost(), smbpp.validate_current_solution()
+
+
+def make_row(name, smbpp, result):
+    """
+    Row of the results table of a job, from its result on the (original) instance.
+    """
+    vins = ins.get_info_from_name(name)
+    def rounded(key, digits=4):
+        value = result.get(key)
+        return round(value, digits) if value is not None else None
+    return {
+        "optimizer_name": result['name'],
+        "N": smbpp.n_product,
+        "M": smbpp.n_clients,
+        "d": vins['d'],
+        "idx": vins['idx'],
+        "time": round(result['time'], 4),
+        "LB": rounded('LB', 2),
+        "UB": rounded('UB', 2),
+        "is_valid": result['is_valid'],
+        "N_reduced": result.get('N_reduced', smbpp.n_product),
+        "M_reduced": result.get('M_reduced', smbpp.n_clients),
+        "build_time": rounded('build_time'),
+        "bound_time": rounded('bound_time'),
+        "solve_time": rounded('solve_time'),
+        "validate_time": rounded('validate_time'),
+        "lp_solves": result.get('lp_solves', 0),
+        "milp_solves": result.get('milp_solves', 0),
+        "simplex_iterations": result.get('simplex_iterations', 0),
+        "evals_per_sec": rounded('evals_per_sec', 2),
+        "cache_hits": result.get('cache_hits'),
+        "screened_moves": result.get('screened_moves', 0),
+        "timed_out": result.get('timed_out', False),
+        "time_to_best": rounded('time_to_best'),
+        "trace": [(round(t, 4), lb, ub) for t, lb, ub in result.get('trace', [])]
+    }
+
+
 if __name__ == "__main__":
     main()
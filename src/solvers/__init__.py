@@ -0,0 +1,29 @@
+from .base import SolverModel
+
+BACKENDS = ('gurobi', 'highs')
+
+def get_model(backend='gurobi', timeout=None, verbose=0, seed=42, name='smbpp'):
+    """
+    Creates an empty model of the given solver backend ('gurobi' or 'highs').
+    """
+    if backend == 'gurobi':
+        from .gurobi import GurobiModel
+        return GurobiModel(timeout, verbose, seed, name)
+    if backend == 'highs':
+        from .highs import HighsModel
+        return HighsModel(timeout, verbose, seed, name)
+    raise ValueError(f'Unknown solver backend: {backend}')
+
+def init_worker(backend='gurobi', threads=0):
+    """
+    Prepares the solver of a worker process: a private environment (Gurobi) limited to
+    `threads` solver threads (0 - Let the solver decide).
+    """
+    if backend == 'gurobi':
+        from src.util import init_gurobi_env
+        init_gurobi_env(threads)
+    elif backend == 'highs':
+        from . import highs
+        highs.set_threads(threads)
+    else:
+        raise ValueError(f'Unknown solver backend: {backend}')
@@ -0,0 +1,121 @@
+from abc import ABC, abstractmethod
+
+class SolverModel(ABC):
+    """
+    Solver independent model built from matrix-form input.
+
+    Variables and constraints are identified by their (column and row) indices, in the
+    order they were added. Constraint senses are '<', '>' or '='.
+    """
+
+    @abstractmethod
+    def add_vars(self, n, lb=0.0, ub=float('inf'), binary=False):
+        """
+        Adds n variables. lb and ub may be scalars or arrays.
+
+        :return: array with the indices of the new variables.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_constr(self, cols, coeffs, sense, rhs):
+        """
+        Adds the constraint sum_k coeffs[k] * v[cols[k]] (sense) rhs.
+
+        :return: index of the new constraint.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_constrs(self, A, sense, rhs):
+        """
+        Adds the constraints A v (sense) rhs, where A is a sparse matrix with one column per
+        variable of the model.
+
+        :return: array with the indices of the new constraints.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_qconstr(self, q_rows, q_cols, q_vals, cols, coeffs, sense, rhs):
+        """
+        Adds the quadratic constraint
+            sum_k q_vals[k] * v[q_rows[k]] * v[q_cols[k]] + sum_k coeffs[k] * v[cols[k]] (sense) rhs.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_objective(self, c, maximize=True, q=None):
+        """
+        Sets the objective c v, plus the quadratic terms given as (rows, cols, vals) in q.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_obj_coeffs(self, cols, values):
+        """
+        Changes the linear objective coefficients of some variables.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_rhs(self, rows, values):
+        """
+        Changes the right-hand side of some constraints (inf relaxes a '<' constraint).
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_start(self, cols, values):
+        """
+        Sets a warm start (MIP start) for some variables.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_solution_source(self, source):
+        """
+        Sets a function polled while solving a MIP that returns a solution found elsewhere,
+        as (cols, values), for the solver to try as incumbent (None - Nothing new).
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_incumbent_columns(self, cols):
+        """
+        Sets the columns whose values are passed on, as its solution, with each incumbent of
+        a MIP solve reported to src.stats (e.g. the clients decision).
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def optimize(self):
+        """
+        Solves the model, warm started from the previous solve when possible.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def obj_val(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def obj_bound(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_values(self, cols=None):
+        """
+        :return: array with the values of the variables (all of them when cols is None).
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_duals(self, rows=None):
+        """
+        :return: array with the duals of the constraints (all of them when rows is None).
+        """
+        raise NotImplementedError
+
+    def print_stats(self):
+        pass
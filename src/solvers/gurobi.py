@@ -0,0 +1,122 @@
+import numpy as np
+import gurobipy as gp
+from scipy.sparse import csr_matrix
+from gurobipy import GRB
+from src import stats
+from src.util import get_gurobi_model
+from .base import SolverModel
+
+def _floats(values):
+    return np.asarray(values, dtype=np.float64).tolist()
+
+def _mip_callback(run_stats, source, variables, incumbent_cols):
+    """
+    Callback reporting the incumbent (with the values of incumbent_cols, when given) and the
+    bound of a MIP solve to run_stats and trying the solutions given by source (see
+    SolverModel.set_solution_source) at each node.
+    """
+    def callback(model, where):
+        if where == GRB.Callback.MIP:
+            run_stats.incumbent(model.cbGet(GRB.Callback.MIP_OBJBST),
+                model.cbGet(GRB.Callback.MIP_OBJBND))
+        elif where == GRB.Callback.MIPSOL:
+            solution = None
+            if incumbent_cols is not None:
+                solution = np.rint(model.cbGetSolution([variables[i] for i in incumbent_cols]))
+            run_stats.incumbent(model.cbGet(GRB.Callback.MIPSOL_OBJ),
+                model.cbGet(GRB.Callback.MIPSOL_OBJBND), solution=solution)
+        elif where == GRB.Callback.MIPNODE and source is not None:
+            solution = source()
+            if solution is not None:
+                cols, values = solution
+                model.cbSetSolution([variables[i] for i in cols], _floats(values))
+                model.cbUseSolution()
+    return callback
+
+class GurobiModel(SolverModel):
+    def __init__(self, timeout=None, verbose=0, seed=42, name='smbpp'):
+        self.model = get_gurobi_model(timeout, verbose, seed, name)
+        self.is_mip = False
+        self._source = None
+        self._incumbent_cols = None
+        self._vars = []
+        self._constrs = []
+
+    def add_vars(self, n, lb=0.0, ub=float('inf'), binary=False):
+        vtype = GRB.BINARY if binary else GRB.CONTINUOUS
+        self.is_mip = self.is_mip or binary
+        new = self.model.addMVar(n, lb=lb, ub=np.minimum(ub, GRB.INFINITY), vtype=vtype).tolist()
+        self._vars += new
+        return np.arange(len(self._vars) - n, len(self._vars))
+
+    def add_constr(self, cols, coeffs, sense, rhs):
+        expr = gp.LinExpr(_floats(coeffs), [self._vars[i] for i in cols])
+        self._constrs.append(self.model.addLConstr(expr, sense, rhs))
+        return len(self._constrs) - 1
+
+    def add_constrs(self, A, sense, rhs):
+        A = csr_matrix(A, dtype=np.float64)
+        rhs = np.minimum(np.broadcast_to(np.asarray(rhs, dtype=np.float64), A.shape[0]), GRB.INFINITY)
+        new = self.model.addMConstr(A, self._vars, sense, rhs).tolist()
+        self._constrs += new
+        return np.arange(len(self._constrs) - len(new), len(self._constrs))
+
+    def add_qconstr(self, q_rows, q_cols, q_vals, cols, coeffs, sense, rhs):
+        expr = gp.QuadExpr(gp.LinExpr(_floats(coeffs), [self._vars[i] for i in cols]))
+        expr.addTerms(_floats(q_vals), [self._vars[i] for i in q_rows], [self._vars[i] for i in q_cols])
+        self.model.addQConstr(expr, sense, rhs)
+
+    def set_objective(self, c, maximize=True, q=None):
+        c = np.asarray(c, dtype=np.float64)
+        nz = np.flatnonzero(c)
+        expr = gp.LinExpr(c[nz].tolist(), [self._vars[i] for i in nz])
+        if q is not None:
+            q_rows, q_cols, q_vals = q
+            expr = gp.QuadExpr(expr)
+            expr.addTerms(_floats(q_vals), [self._vars[i] for i in q_rows],
+                [self._vars[i] for i in q_cols])
+        self.model.setObjective(expr, GRB.MAXIMIZE if maximize else GRB.MINIMIZE)
+
+    def set_obj_coeffs(self, cols, values):
+        self.model.setAttr('Obj', [self._vars[i] for i in cols], _floats(values))
+
+    def set_rhs(self, rows, values):
+        values = np.minimum(np.asarray(values, dtype=np.float64), GRB.INFINITY)
+        self.model.setAttr('RHS', [self._constrs[i] for i in rows], values.tolist())
+
+    def set_start(self, cols, values):
+        self.model.setAttr('Start', [self._vars[i] for i in cols], _floats(values))
+
+    def set_solution_source(self, source):
+        self._source = source
+
+    def set_incumbent_columns(self, cols):
+        self._incumbent_cols = cols
+
+    def optimize(self):
+        run_stats = stats.current()
+        with run_stats.timer('solve_time'):
+            if self.is_mip and (run_stats.enabled or self._source is not None):
+                self.model.optimize(_mip_callback(run_stats, self._source, self._vars,
+                    self._incumbent_cols))
+            else:
+                self.model.optimize()
+        run_stats.add('milp_solves' if self.model.IsMIP else 'lp_solves')
+        run_stats.add('simplex_iterations', int(self.model.IterCount))
+
+    def obj_val(self):
+        return self.model.ObjVal
+
+    def obj_bound(self):
+        return self.model.ObjBound if self.model.IsMIP else self.model.ObjVal
+
+    def get_values(self, cols=None):
+        variables = self._vars if cols is None else [self._vars[i] for i in cols]
+        return np.array(self.model.getAttr('X', variables))
+
+    def get_duals(self, rows=None):
+        constrs = self._constrs if rows is None else [self._constrs[i] for i in rows]
+        return np.array(self.model.getAttr('Pi', constrs))
+
+    def print_stats(self):
+        self.model.printStats()
@@ -0,0 +1,151 @@
+import numpy as np
+import highspy
+from src import stats
+from .base import SolverModel
+
+# Solver threads of the current process (0 - HiGHS decides)
+_threads = 0
+
+def set_threads(threads):
+    global _threads
+    _threads = threads
+
+class HighsModel(SolverModel):
+    """
+    HiGHS implementation of SolverModel (linear models only: HiGHS solves neither
+    quadratic constraints nor non-convex quadratic objectives).
+    """
+
+    def __init__(self, timeout=None, verbose=0, seed=42, name='smbpp'):
+        self.highs = highspy.Highs()
+        self.highs.setOptionValue('output_flag', verbose == 2)
+        self.highs.setOptionValue('random_seed', seed)
+        if timeout is not None:
+            self.highs.setOptionValue('time_limit', max(float(timeout), 0.0))
+        if _threads:
+            self.highs.setOptionValue('threads', _threads)
+        self.name = name
+        self.is_mip = False
+        self._traced = False
+        self._incumbent_cols = None
+        self._senses = []
+        self._start = np.zeros(0)
+
+    def add_vars(self, n, lb=0.0, ub=float('inf'), binary=False):
+        beg = self.highs.getNumCol()
+        if binary:
+            ub = np.minimum(ub, 1.0)
+        empty = np.zeros(0, dtype=np.int32)
+        self.highs.addCols(n, np.zeros(n), np.broadcast_to(np.asarray(lb, dtype=np.float64), n),
+            np.broadcast_to(np.asarray(ub, dtype=np.float64), n), 0, empty, empty, np.zeros(0))
+        cols = np.arange(beg, beg + n, dtype=np.int32)
+        if binary:
+            self.is_mip = True
+            self.highs.changeColsIntegrality(n, cols, np.full(n, highspy.HighsVarType.kInteger))
+        self._start = np.concatenate([self._start, np.zeros(n)])
+        return cols
+
+    @staticmethod
+    def _bounds(sense, rhs):
+        rhs = np.asarray(rhs, dtype=np.float64)
+        inf = np.full(rhs.shape, highspy.kHighsInf)
+        if sense == '<':
+            return -inf, rhs
+        if sense == '>':
+            return rhs, inf
+        return rhs, rhs
+
+    def add_constr(self, cols, coeffs, sense, rhs):
+        lower, upper = HighsModel._bounds(sense, rhs)
+        self.highs.addRow(float(lower), float(upper), len(cols), np.asarray(cols, dtype=np.int32),
+            np.asarray(coeffs, dtype=np.float64))
+        self._senses.append(sense)
+        return len(self._senses) - 1
+
+    def add_constrs(self, A, sense, rhs):
+        A = A.tocsr()
+        lower, upper = HighsModel._bounds(sense, np.broadcast_to(rhs, A.shape[0]))
+        self.highs.addRows(A.shape[0], lower, upper, A.nnz, A.indptr[:-1].astype(np.int32),
+            A.indices.astype(np.int32), A.data.astype(np.float64))
+        self._senses += [sense] * A.shape[0]
+        return np.arange(len(self._senses) - A.shape[0], len(self._senses))
+
+    def add_qconstr(self, q_rows, q_cols, q_vals, cols, coeffs, sense, rhs):
+        raise NotImplementedError('HiGHS does not support quadratic constraints')
+
+    def set_objective(self, c, maximize=True, q=None):
+        if q is not None:
+            raise NotImplementedError('HiGHS does not support non-convex quadratic objectives')
+        n = self.highs.getNumCol()
+        self.highs.changeColsCost(n, np.arange(n, dtype=np.int32), np.asarray(c, dtype=np.float64))
+        self.highs.changeObjectiveSense(
+            highspy.ObjSense.kMaximize if maximize else highspy.ObjSense.kMinimize)
+
+    def set_obj_coeffs(self, cols, values):
+        self.highs.changeColsCost(len(cols), np.asarray(cols, dtype=np.int32),
+            np.asarray(values, dtype=np.float64))
+
+    def set_rhs(self, rows, values):
+        rows = np.asarray(rows, dtype=np.int32)
+        values = np.asarray(values, dtype=np.float64)
+        lower, upper = np.empty(len(rows)), np.empty(len(rows))
+        for k, row in enumerate(rows):
+            lower[k], upper[k] = HighsModel._bounds(self._senses[row], values[k])
+        self.highs.changeRowsBounds(len(rows), rows, lower, upper)
+
+    def set_start(self, cols, values):
+        self._start[np.asarray(cols)] = values
+        solution = highspy.HighsSolution()
+        solution.col_value = self._start.tolist()
+        self.highs.setSolution(solution)
+
+    def set_solution_source(self, source):
+        def callback(event):
+            solution = source()
+            if solution is not None:
+                cols, values = solution
+                event.data_in.setSolution(np.asarray(cols, dtype=np.int32),
+                    np.asarray(values, dtype=np.float64))
+        self.highs.cbMipUserSolution.subscribe(callback)
+
+    def set_incumbent_columns(self, cols):
+        self._incumbent_cols = np.asarray(cols)
+
+    def optimize(self):
+        run_stats = stats.current()
+        if self.is_mip and run_stats.enabled and not self._traced:
+            # Reports the incumbent (with its solution) and the bound of the MIP solves
+            def improving(event):
+                solution, cols = None, self._incumbent_cols
+                if cols is not None:
+                    solution = np.rint(np.asarray(event.data_out.mip_solution)[cols])
+                run_stats.incumbent(event.data_out.mip_primal_bound, event.data_out.mip_dual_bound,
+                    solution=solution)
+            def interrupt(event):
+                run_stats.incumbent(event.data_out.mip_primal_bound, event.data_out.mip_dual_bound)
+            self.highs.cbMipImprovingSolution.subscribe(improving)
+            self.highs.cbMipInterrupt.subscribe(interrupt)
+            self._traced = True
+        with run_stats.timer('solve_time'):
+            self.highs.run()
+        run_stats.add('milp_solves' if self.is_mip else 'lp_solves')
+        run_stats.add('simplex_iterations', self.highs.getInfo().simplex_iteration_count)
+
+    def obj_val(self):
+        return self.highs.getInfo().objective_function_value
+
+    def obj_bound(self):
+        info = self.highs.getInfo()
+        return info.mip_dual_bound if self.is_mip else info.objective_function_value
+
+    def get_values(self, cols=None):
+        values = np.array(self.highs.getSolution().col_value)
+        return values if cols is None else values[np.asarray(cols)]
+
+    def get_duals(self, rows=None):
+        duals = np.array(self.highs.getSolution().row_dual)
+        return duals if rows is None else duals[np.asarray(rows)]
+
+    def print_stats(self):
+        print(f'Model {self.name}: {self.highs.getNumRow()} rows, {self.highs.getNumCol()} '
+              f'columns, {self.highs.getNumNz()} nonzeros')
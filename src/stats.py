@@ -0,0 +1,164 @@
+"""
+Instrumentation of the optimizers' hot paths.
+
+BaseOptimizer.solve activates a Stats object for the run; solvers, the pricing oracle and
+the optimizers report into stats.current(). When instrumentation is off, current() is a
+NullStats whose methods do nothing.
+
+Every run also keeps an anytime trace: a (time, LB, UB) point each time the incumbent or
+the bound improves (see src.metrics for the summaries built from it).
+
+Concurrent runs (see src.optimizers.portfolio) exchange incumbents and bounds through the
+on_improve and shared hooks of Stats; heuristics stop once proven_optimal() holds.
+"""
+
+import threading
+from collections import defaultdict
+from math import inf
+from contextlib import contextmanager, nullcontext
+from time import time
+
+# Relative gap under which an incumbent is optimal (the default MIP gap of the solvers)
+OPTIMALITY_GAP = 1e-4
+
+class Stats:
+    """
+    Counters, timers and convergence trace of one optimizer run.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.start_time = time()
+        self.counters = defaultdict(int)
+        self.lb, self.ub = None, None # Best incumbent value and best bound
+        self.lb_time = None # Time when the best incumbent was found
+        self.trace = [] # (time, LB, UB) of each improvement
+        self.on_improve = None # Called with (LB, UB, solution) after each improvement
+        self.shared = None # Returns the (LB, UB) known by concurrent runs
+        self._lock = threading.Lock() # incumbent is also called by collector threads
+
+    def add(self, name, value=1):
+        self.counters[name] += value
+
+    @contextmanager
+    def timer(self, name):
+        start = time()
+        try:
+            yield
+        finally:
+            self.counters[name] += time() - start
+
+    def incumbent(self, value, bound=None, at=None, solution=None):
+        """
+        Reports an incumbent value and, optionally, an upper bound, found now or at the given
+        time (time() of another process). Values that are None or infinite (no solution or
+        no bound yet) are ignored. The clients decision of the incumbent, when given, is
+        passed on to on_improve.
+        """
+        now, new_lb, new_ub = (time() if at is None else at) - self.start_time, False, False
+        with self._lock:
+            if value is not None and abs(value) < 1e99 and (self.lb is None or value > self.lb):
+                self.lb, self.lb_time, new_lb = value, now, True
+            if bound is not None and abs(bound) < 1e99 and (self.ub is None or bound < self.ub):
+                self.ub, new_ub = bound, True
+            if new_lb or new_ub:
+                self.trace.append((now, self.lb, self.ub))
+                if self.on_improve is not None:
+                    self.on_improve(self.lb, self.ub, solution if new_lb else None)
+
+    def proven_optimal(self):
+        """
+        Whether the best incumbent, of this run or of a concurrent one, is within
+        OPTIMALITY_GAP of the best bound.
+        """
+        lb, ub = self.lb, self.ub
+        if self.shared is not None:
+            shared_lb, shared_ub = self.shared()
+            lb = shared_lb if lb is None else max(lb, shared_lb)
+            ub = shared_ub if ub is None else min(ub, shared_ub)
+        if lb is None or ub is None or max(abs(lb), abs(ub)) == inf:
+            return False
+        return ub - lb <= OPTIMALITY_GAP * max(1.0, abs(ub))
+
+    def summary(self):
+        elapsed = time() - self.start_time
+        summary = dict(self.counters)
+        if 'evaluations' in summary:
+            summary['evals_per_sec'] = summary['evaluations'] / elapsed if elapsed > 0 else 0.0
+        summary['trace'] = list(self.trace)
+        summary['time_to_best'] = self.lb_time
+        return summary
+
+
+class NullStats:
+    """
+    Stats that records nothing.
+    """
+
+    enabled = False
+    _timer = nullcontext()
+
+    def add(self, name, value=1):
+        pass
+
+    def timer(self, name):
+        return self._timer
+
+    def incumbent(self, value, bound=None, at=None, solution=None):
+        pass
+
+    def proven_optimal(self):
+        return False
+
+    def summary(self):
+        return {}
+
+
+class IncumbentStats(Stats):
+    """
+    Stats of an uninstrumented run that only follows its incumbent and bound, for
+    on_improve (see src.executor): it records no counters nor timers and has no summary.
+    """
+
+    def add(self, name, value=1):
+        pass
+
+    def timer(self, name):
+        return NullStats._timer
+
+    def summary(self):
+        return {}
+
+
+NULL = NullStats()
+_current = NULL
+
+def current():
+    return _current
+
+def reset():
+    """
+    Deactivates the Stats inherited from the parent by a forked worker process, so that the
+    worker collects its own run (see src.optimizers.genetic_algorithm).
+    """
+    global _current
+    _current = NULL
+
+@contextmanager
+def collect(enabled=True, on_improve=None):
+    """
+    Activates a new Stats for the block, unless instrumentation is off or a run is already
+    being instrumented (nested solves report into the outer run). With on_improve, an
+    uninstrumented block still gets an IncumbentStats calling it.
+    """
+    global _current
+    if _current is not NULL or not enabled and on_improve is None:
+        yield _current
+        return
+    _current = Stats() if enabled else IncumbentStats()
+    _current.on_improve = on_improve
+    try:
+        yield _current
+    finally:
+        _current = NULL
@@ -1,19 +1,56 @@
 import json
+import queue
 import gurobipy as gp
+from time import time
+
+# Solver environment of the current process (None - Gurobi default environment)
+_env = None
+
+def init_gurobi_env(threads=0):
+    """
+    Creates a private Gurobi environment for the current process, limited to `threads`
+    solver threads (0 - Gurobi decides). Used by worker processes so that parallel jobs
+    do not share an environment nor oversubscribe the CPU.
+    """
+    global _env
+    _env = gp.Env(empty=True)
+    _env.setParam(gp.GRB.Param.OutputFlag, 0)
+    _env.setParam(gp.GRB.Param.Threads, threads)
+    _env.start()
+    return _env
 
 def get_gurobi_model(timeout=None, verbose=0, seed=42, name='smbpp'):
     # Create a new model
-    model = gp.Model(name)
+    model = gp.Model(name, env=_env)
 
     # Set Params
     model.setParam(gp.GRB.Param.OutputFlag, int(verbose==2))
     model.setParam(gp.GRB.Param.Seed, seed)
 
-    if timeout:
-        model.setParam(gp.GRB.Param.TimeLimit, timeout)
+    if timeout is not None:
+        model.setParam(gp.GRB.Param.TimeLimit, max(timeout, 0))
 
     return model
 
+def gather(results, processes, timeout):
+    """
+    Gets the results that the processes put in the results queue, one each, until every
+    process has reported or exited (a process that died does not report) or timeout seconds
+    have passed.
+
+    :return: list of the results received.
+    """
+    received, deadline = [], time() + timeout
+    while len(received) < len(processes) and time() < deadline:
+        # Checked before polling: once all of them exited, their results are in the queue
+        alive = any(process.is_alive() for process in processes)
+        try:
+            received.append(results.get(timeout=0.1))
+        except queue.Empty:
+            if not alive:
+                break
+    return received
+
 def read_json(filename):
     with open(filename, "r") as file:
         data = json.loads(file.read())